@@ -13,15 +13,30 @@ Key Responsibilities:
 """
 
 import logging
+import os
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, NamedTuple
 from dataclasses import dataclass
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from agents.timestamps import now_iso
+    from agents.file_io import write_json
+except ModuleNotFoundError:  # Run directly as a script from agents/
+    from timestamps import now_iso
+    from file_io import write_json
 
 logger = logging.getLogger(__name__)
 
 
+class SelectionRationale(NamedTuple):
+    """Human-readable rationale for the data selection"""
+    selection_method: str
+    reduction_ratio: str
+    key_factors: str
+    quality_assurance: str
+
+
 @dataclass
 class DataFilterOutput:
     """Machine-readable output from data filtering stage"""
@@ -30,10 +45,28 @@ class DataFilterOutput:
     filtered_row_count: int
     selection_criteria: Dict[str, Any]
     filtered_data: pd.DataFrame
-    selection_rationale: Dict[str, str]
+    selection_rationale: SelectionRationale
     data_coverage_score: float
     efficiency_score: float
     recommended_next_stage: str
+    
+    def to_metadata(self) -> Dict[str, Any]:
+        """
+        Filter metadata for the output generation stage, without the data itself
+        
+        The filtered frame is handed to the next stage by reference, so this
+        avoids dataclasses.asdict(), which would deep-copy the DataFrame.
+        """
+        return {
+            "timestamp": self.timestamp,
+            "original_row_count": self.original_row_count,
+            "filtered_row_count": self.filtered_row_count,
+            "selection_criteria": self.selection_criteria,
+            "selection_rationale": self.selection_rationale,
+            "data_coverage_score": self.data_coverage_score,
+            "efficiency_score": self.efficiency_score,
+            "recommended_next_stage": self.recommended_next_stage
+        }
 
 
 class DataFilterAgent:
@@ -47,6 +80,7 @@ class DataFilterAgent:
     def __init__(self, config_path: str = None):
         """Initialize the data filter agent"""
         self.config = self._load_config(config_path)
+        self._rng = np.random.default_rng()
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load agent configuration"""
@@ -81,25 +115,32 @@ class DataFilterAgent:
         
         original_count = len(data)
         filtering_criteria = question_analysis.get("filtering_criteria", {})
+        columns = frozenset(data.columns)
         
         # Step 1: Apply basic filters (thresholds, quality checks)
-        filtered_data = self._apply_basic_filters(data, filtering_criteria)
+        filtered_data = self._apply_basic_filters(data, filtering_criteria, columns)
         
-        # Step 2: Calculate selection scores for each row
-        scored_data = self._calculate_selection_scores(filtered_data, filtering_criteria)
-        
-        # Step 3: Select representative subset
-        final_data = self._select_representative_subset(scored_data, filtering_criteria)
-        
-        # Step 4: Generate selection rationale
-        rationale = self._generate_selection_rationale(final_data, original_count, filtering_criteria)
+        max_rows = filtering_criteria.get("max_rows", self.config["max_rows"])
+        selection_skipped = len(filtered_data) <= max_rows
+        if selection_skipped:
+            # Everything fits already, so scoring and selection would keep every row
+            final_data = filtered_data
+        else:
+            # Step 2: Calculate selection scores and weighted features for each row
+            selection_scores, features = self._calculate_selection_scores(filtered_data, filtering_criteria,
+                                                                           columns)
+            
+            # Step 3: Select representative subset
+            final_data = self._select_representative_subset(filtered_data, selection_scores, features,
+                                                            filtering_criteria)
         
-        # Step 5: Calculate quality metrics
-        coverage_score = self._calculate_coverage_score(final_data, data)
-        efficiency_score = self._calculate_efficiency_score(final_data, filtering_criteria)
+        # Step 4: Calculate quality metrics and selection rationale in one pass
+        coverage_score, efficiency_score, rationale = self._compute_quality_metrics(
+            final_data, data, filtering_criteria, selection_skipped
+        )
         
         output = DataFilterOutput(
-            timestamp=datetime.now().isoformat(),
+            timestamp=now_iso(),
             original_row_count=original_count,
             filtered_row_count=len(final_data),
             selection_criteria=filtering_criteria,
@@ -113,107 +154,193 @@ class DataFilterAgent:
         logger.info(f"Data filtering complete. Output rows: {len(final_data)}")
         return output
     
-    def _apply_basic_filters(self, data: pd.DataFrame, criteria: Dict[str, Any]) -> pd.DataFrame:
+    def filter_batch(self, datasets: List[pd.DataFrame], question_analyses: List[Dict[str, Any]],
+                     schema_metadata: List[Dict[str, Any]]) -> List[DataFilterOutput]:
+        """
+        Filter data for several questions concurrently
+        
+        Each item is independent, and the numpy work in filter_data releases
+        the GIL, so items are processed on a shared thread pool.
+        
+        Args:
+            datasets: Full dataset to filter for each question
+            question_analyses: Question analysis output for each question
+            schema_metadata: Schema information for each question
+            
+        Returns:
+            List of DataFilterOutput in the same order as the inputs
+        """
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+            return list(executor.map(self.filter_data, datasets, question_analyses, schema_metadata))
+    
+    def _apply_basic_filters(self, data: pd.DataFrame, criteria: Dict[str, Any],
+                             columns: frozenset) -> pd.DataFrame:
         """Apply basic threshold and quality filters"""
         # TODO: Implement basic filtering logic
-        filtered_data = data.copy()
-        
         # Apply minimum thresholds if specified
         min_priority = criteria.get("min_priority_score", self.config["min_priority_score"])
         min_volume = criteria.get("min_sales_volume", self.config["min_sales_volume"])
         
         # Example filtering (would be adapted based on actual data schema)
-        if "priority_score" in filtered_data.columns:
-            filtered_data = filtered_data[filtered_data["priority_score"] >= min_priority]
+        # Thresholds are combined into one mask so the frame is indexed only once
+        mask = np.ones(len(data), dtype=bool)
+        if "priority_score" in columns:
+            mask &= data["priority_score"].to_numpy() >= min_priority
+        
+        if "sales_volume" in columns:
+            mask &= data["sales_volume"].to_numpy() >= min_volume
         
-        if "sales_volume" in filtered_data.columns:
-            filtered_data = filtered_data[filtered_data["sales_volume"] >= min_volume]
+        filtered_data = data[mask]
         
         logger.info(f"Basic filters applied. Rows remaining: {len(filtered_data)}")
         return filtered_data
     
-    def _calculate_selection_scores(self, data: pd.DataFrame, criteria: Dict[str, Any]) -> pd.DataFrame:
-        """Calculate selection scores for each row based on multiple criteria"""
-        # TODO: Implement sophisticated scoring algorithm
-        scored_data = data.copy()
+    def _calculate_selection_scores(self, data: pd.DataFrame, criteria: Dict[str, Any],
+                                    columns: frozenset) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate selection scores for each row based on multiple criteria
         
+        Returns:
+            Tuple of (selection_scores, weighted feature matrix with one column per component)
+        """
+        # TODO: Implement sophisticated scoring algorithm
         # Get selection weights
         weights = criteria.get("selection_weights", self.config["selection_weights"])
         
-        # Calculate component scores (0-1 scale)
-        scored_data["representative_score"] = self._calculate_representative_score(data)
-        scored_data["priority_score_norm"] = self._normalize_priority_score(data)
-        scored_data["volume_score_norm"] = self._normalize_volume_score(data)
-        
-        # Calculate weighted composite score
-        scored_data["selection_score"] = (
-            weights["representative"] * scored_data["representative_score"] +
-            weights["priority_score"] * scored_data["priority_score_norm"] +
-            weights["sales_volume"] * scored_data["volume_score_norm"]
-        )
+        # Extract hot columns once as ndarrays (None if the column is absent). They
+        # only feed the float32 feature matrix, so they are read as float32 too,
+        # halving the memory traffic of the normalization passes.
+        priority = data["priority_score"].to_numpy(dtype=np.float32) if "priority_score" in columns else None
+        volume = data["sales_volume"].to_numpy(dtype=np.float32) if "sales_volume" in columns else None
         
-        return scored_data
+        # Component scores (0-1 scale) are kept as a weighted feature matrix so
+        # they never land as scratch columns on a copy of the frame. Normalized
+        # scores don't need double precision, so the matrix is float32.
+        features = np.empty((len(data), 3), dtype=np.float32)
+        features[:, 0] = weights["representative"] * self._calculate_representative_score(data)
+        features[:, 1] = weights["priority_score"] * self._normalize(priority, len(data))
+        features[:, 2] = weights["sales_volume"] * self._normalize(volume, len(data))
+        return features.sum(axis=1), features
     
-    def _calculate_representative_score(self, data: pd.DataFrame) -> pd.Series:
+    def _calculate_representative_score(self, data: pd.DataFrame) -> np.ndarray:
         """Calculate how representative each row is for the analysis"""
         # TODO: Implement representativeness calculation
         # This would consider geographic diversity, performance variance, etc.
         # Placeholder: random scores for now
-        return pd.Series(np.random.random(len(data)), index=data.index)
+        return self._rng.random(len(data), dtype=np.float32)
     
-    def _normalize_priority_score(self, data: pd.DataFrame) -> pd.Series:
-        """Normalize priority scores to 0-1 scale"""
-        if "priority_score" in data.columns:
-            priority_col = data["priority_score"]
-            return (priority_col - priority_col.min()) / (priority_col.max() - priority_col.min())
-        return pd.Series(0.5, index=data.index)  # Default if no priority score
-    
-    def _normalize_volume_score(self, data: pd.DataFrame) -> pd.Series:
-        """Normalize sales volume to 0-1 scale"""
-        if "sales_volume" in data.columns:
-            volume_col = data["sales_volume"]
-            return (volume_col - volume_col.min()) / (volume_col.max() - volume_col.min())
-        return pd.Series(0.5, index=data.index)  # Default if no volume data
+    def _normalize(self, values: Optional[np.ndarray], row_count: int) -> np.ndarray:
+        """Min/max normalize values to 0-1 scale, using 0.5 when missing or all values are equal"""
+        if values is None or len(values) == 0:
+            return np.full(row_count, 0.5, dtype=np.float32)  # Default if the column is not available
+        
+        low = np.nanmin(values)
+        value_range = np.nanmax(values) - low
+        if not value_range > 0:
+            return np.full(row_count, 0.5, dtype=np.float32)
+        return (values - low) * (1.0 / value_range)
     
-    def _select_representative_subset(self, scored_data: pd.DataFrame, criteria: Dict[str, Any]) -> pd.DataFrame:
-        """Select the final representative subset based on scores"""
+    def _select_representative_subset(self, data: pd.DataFrame, scores: np.ndarray, features: np.ndarray,
+                                      criteria: Dict[str, Any]) -> pd.DataFrame:
+        """
+        Select the final representative subset based on scores
+        
+        Uses greedy k-center (farthest-point) selection over the weighted feature
+        matrix, seeded with the highest scoring row, so the subset spreads across
+        the score space instead of clustering at the top.
+        """
         max_rows = criteria.get("max_rows", self.config["max_rows"])
         
-        # Sort by selection score and take top N
-        selected_data = scored_data.nlargest(max_rows, "selection_score")
+        if len(data) <= max_rows:
+            return data
         
-        # Remove scoring columns from final output
-        score_columns = ["representative_score", "priority_score_norm", "volume_score_norm", "selection_score"]
-        final_data = selected_data.drop(columns=[col for col in score_columns if col in selected_data.columns])
+        k = max(max_rows, 0)
+        if k == 0:
+            return data.iloc[:0]
         
-        return final_data
-    
-    def _generate_selection_rationale(self, selected_data: pd.DataFrame, original_count: int, 
-                                    criteria: Dict[str, Any]) -> Dict[str, str]:
-        """Generate human-readable rationale for data selection"""
-        # TODO: Implement rationale generation
-        return {
-            "selection_method": "Weighted scoring based on representativeness, priority, and volume",
-            "reduction_ratio": f"{len(selected_data)}/{original_count} ({len(selected_data)/original_count:.1%})",
-            "key_factors": "Geographic diversity, performance variance, business priority",
-            "quality_assurance": "Minimum thresholds applied for data quality"
-        }
+        selected = np.empty(k, dtype=np.intp)
+        selected[0] = int(np.argmax(scores))
+        
+        # Squared distance from each row to its nearest selected row, expanded as
+        # |x|^2 - 2 x.c + |c|^2 so each step is one matrix-vector product
+        # instead of materializing an N x F offsets matrix
+        squared_norms = np.einsum("ij,ij->i", features, features)
+        nearest_distance = np.full(len(scores), np.inf, dtype=np.float32)
+        distance = np.empty_like(nearest_distance)
+        for i in range(1, k):
+            last = selected[i - 1]
+            np.dot(features, features[last], out=distance)
+            distance *= -2.0
+            distance += squared_norms
+            distance += squared_norms[last]
+            np.minimum(nearest_distance, distance, out=nearest_distance)
+            nearest_distance[last] = -1.0  # Never pick a selected row again
+            selected[i] = int(np.argmax(nearest_distance))
+        
+        return data.iloc[selected]
     
-    def _calculate_coverage_score(self, filtered_data: pd.DataFrame, original_data: pd.DataFrame) -> float:
-        """Calculate how well the filtered data covers the original dataset"""
+    def _compute_quality_metrics(self, filtered_data: pd.DataFrame, original_data: pd.DataFrame,
+                                 criteria: Dict[str, Any],
+                                 selection_skipped: bool = False) -> Tuple[float, float, SelectionRationale]:
+        """
+        Calculate coverage score, efficiency score and selection rationale together
+        
+        One place returns all three values, so aggregates over the filtered and
+        original data can be shared between them once the coverage and
+        efficiency metrics are implemented; both are placeholders for now. When
+        selection_skipped is set, every row that passed the basic filters was
+        kept, and the scores and rationale say so.
+        
+        Returns:
+            Tuple of (data_coverage_score, efficiency_score, selection_rationale)
+        """
+        selected_count = len(filtered_data)
+        original_count = len(original_data)
+        selected_ratio = selected_count / original_count if original_count else 0.0
+        
+        if selection_skipped:
+            rationale = SelectionRationale(
+                selection_method="All rows kept: the filtered data already fits max_rows",
+                reduction_ratio=f"{selected_count}/{original_count} ({selected_ratio:.1%})",
+                key_factors="No subset selection needed",
+                quality_assurance="Minimum thresholds applied for data quality"
+            )
+            return 1.0, 1.0, rationale
+        
         # TODO: Implement coverage calculation
         # This would measure geographic coverage, performance range coverage, etc.
-        return 0.85  # Placeholder
-    
-    def _calculate_efficiency_score(self, filtered_data: pd.DataFrame, criteria: Dict[str, Any]) -> float:
-        """Calculate efficiency score based on data reduction and quality"""
+        coverage_score = 0.85  # Placeholder
+        
         # TODO: Implement efficiency calculation
-        return 0.90  # Placeholder
+        efficiency_score = 0.90  # Placeholder
+        
+        # TODO: Implement rationale generation
+        rationale = SelectionRationale(
+            selection_method="Diversity (k-center) selection over weighted representativeness, priority, and volume",
+            reduction_ratio=f"{selected_count}/{original_count} ({selected_ratio:.1%})",
+            key_factors="Geographic diversity, performance variance, business priority",
+            quality_assurance="Minimum thresholds applied for data quality"
+        )
+        
+        return coverage_score, efficiency_score, rationale
     
     def save_output(self, output: DataFilterOutput, output_path: str):
-        """Save filtered data output for next stage"""
-        # TODO: Implement output saving
+        """
+        Save filtered data output for next stage
+        
+        Writes the selected rows to output_path as CSV (the format the output
+        generation stage reads) and the filter metadata to a JSON file alongside
+        it. Only the already-selected subset is written, so the full input frame
+        is never re-materialized here.
+        """
         logger.info(f"Saving filtered data output to {output_path}")
+        
+        output.filtered_data.to_csv(output_path, index=False)
+        
+        metadata = output.to_metadata()
+        metadata["selection_rationale"] = output.selection_rationale._asdict()
+        metadata_path = os.path.splitext(output_path)[0] + "_metadata.json"
+        write_json(metadata_path, metadata)
 
 
 # Entry point for standalone execution
@@ -0,0 +1,74 @@
+"""
+Shared JSON and prompt file helpers for the pipeline agents and test scripts
+
+orjson is an optional, faster serializer. Without it the standard library
+json module writes the same UTF-8 text: non-ASCII characters are kept as-is,
+numpy values become plain numbers and lists, and datetimes become ISO strings.
+"""
+
+import json
+import os
+from dataclasses import asdict, is_dataclass
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_default(obj: Any) -> Any:
+    """Convert values neither serializer handles natively, the same way for both"""
+    if hasattr(obj, "tolist"):  # numpy arrays and scalars
+        return obj.tolist()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    return str(obj)
+
+
+if orjson is not None:
+    # Datetimes and dataclasses pass through to _json_default so both writers format them alike
+    _ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+                       | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+def dump_json(obj: Any, indent: bool = True) -> bytes:
+    """Serialize obj as UTF-8 JSON, indented by two spaces unless indent is False"""
+    if orjson is not None:
+        option = _ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else _ORJSON_OPTIONS
+        return orjson.dumps(obj, option=option, default=_json_default)
+    if indent:
+        text = json.dumps(obj, indent=2, default=_json_default, ensure_ascii=False)
+    else:
+        text = json.dumps(obj, separators=(',', ':'), default=_json_default, ensure_ascii=False)
+    return text.encode('utf-8')
+
+
+def write_json(path: Union[str, Path], obj: Any):
+    """Write obj to path as indented JSON"""
+    with open(path, 'wb') as f:
+        f.write(dump_json(obj))
+
+
+def read_json(path: Union[str, Path]) -> Any:
+    """Parse a JSON file"""
+    data = Path(path).read_bytes()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+@lru_cache(maxsize=32)
+def _cached_prompt_template(path: str, mtime_ns: int, size: int) -> str:
+    """Prompt template text, memoized on path, mtime and size so edits are picked up"""
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def read_prompt_template(path: Union[str, Path]) -> str:
+    """Prompt template text; raises FileNotFoundError when it is missing"""
+    stat = os.stat(path)
+    return _cached_prompt_template(str(path), stat.st_mtime_ns, stat.st_size)
@@ -13,13 +13,51 @@ Key Responsibilities:
 """
 
 import logging
+import os
 import pandas as pd
+import numpy as np
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
-from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from agents.timestamps import now_iso
+    from agents.data_filter import SelectionRationale
+except ModuleNotFoundError:  # Run directly as a script from agents/
+    from timestamps import now_iso
+    from data_filter import SelectionRationale
 
 logger = logging.getLogger(__name__)
 
+# Output section templates, built once at import time
+_HEADER_TEMPLATE = (
+    "Question: {question}\n"
+    "Timestamp: {timestamp}\n"
+    "Data Coverage: {total_locations} locations analyzed\n"
+    + "=" * 50 + "\n\n"
+    "KEY INSIGHTS:\n"
+)
+# Placeholder insight rules as (required column or None, template), formatted
+# against scalars computed once per call
+_INSIGHT_TEMPLATES = (
+    (None, "Analysis based on {row_count} representative locations"),
+    ("priority_score", "{high_priority_count} locations require immediate attention"),  # Performance
+    ("location_name", "Analysis covers diverse geographic locations")  # Geographic
+)
+_RECOMMENDATION_TEMPLATE = (
+    "\n{i}. [{priority}] {action}\n"
+    "   Details: {details}\n"
+    "   Expected Impact: {expected_impact}\n"
+    "   Timeline: {timeline}\n"
+)
+
+
+@lru_cache(maxsize=32)
+def _insight_templates_for(columns: frozenset) -> Tuple[str, ...]:
+    """Insight templates whose required column is present, memoized per column set"""
+    return tuple(template for required_column, template in _INSIGHT_TEMPLATES
+                 if required_column is None or required_column in columns)
+
 
 @dataclass
 class OutputGenerationResult:
@@ -104,7 +142,7 @@ class OutputGeneratorAgent:
         )
         
         result = OutputGenerationResult(
-            timestamp=datetime.now().isoformat(),
+            timestamp=now_iso(),
             question=original_question,
             analysis_type=analysis_type,
             key_insights=insights,
@@ -119,27 +157,41 @@ class OutputGeneratorAgent:
         logger.info("Output generation complete")
         return result
     
+    def generate_batch(self, filtered_datasets: List[pd.DataFrame], question_analyses: List[Dict[str, Any]],
+                       schema_metadata: List[Dict[str, Any]],
+                       filter_metadata: List[Dict[str, Any]]) -> List[OutputGenerationResult]:
+        """
+        Generate output for several questions concurrently on a shared thread pool
+        
+        Args:
+            filtered_datasets: Filtered dataset for each question
+            question_analyses: Question analysis results for each question
+            schema_metadata: Schema discovery results for each question
+            filter_metadata: Data filtering metadata for each question
+            
+        Returns:
+            List of OutputGenerationResult in the same order as the inputs
+        """
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+            return list(executor.map(self.generate_output, filtered_datasets, question_analyses,
+                                     schema_metadata, filter_metadata))
+    
     def _generate_key_insights(self, data: pd.DataFrame, question_analysis: Dict[str, Any]) -> List[str]:
         """Generate key insights from the filtered data"""
         # TODO: Implement intelligent insight generation
         # This would analyze the data based on question type and generate insights
         
-        insights = []
+        if len(data) == 0:
+            return []
         
         # Placeholder insights based on common patterns
-        if len(data) > 0:
-            insights.append(f"Analysis based on {len(data)} representative locations")
-            
-            # Example: Performance insights
-            if "priority_score" in data.columns:
-                high_priority = data[data["priority_score"] > data["priority_score"].median()]
-                insights.append(f"{len(high_priority)} locations require immediate attention")
-            
-            # Example: Geographic insights
-            if "location_name" in data.columns:
-                insights.append(f"Analysis covers diverse geographic locations")
+        columns = frozenset(data.columns)
+        context = {"row_count": len(data)}
+        if "priority_score" in columns:
+            priority = data["priority_score"].to_numpy(dtype=np.float64)
+            context["high_priority_count"] = int(np.count_nonzero(priority > np.nanmedian(priority)))
         
-        return insights
+        return [template.format_map(context) for template in _insight_templates_for(columns)]
     
     def _generate_recommendations(self, data: pd.DataFrame, question_analysis: Dict[str, Any], 
                                 insights: List[str]) -> List[Dict[str, Any]]:
@@ -171,10 +223,14 @@ class OutputGeneratorAgent:
     
     def _create_data_summary(self, data: pd.DataFrame, filter_metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Create summary of data characteristics"""
+        # In-process metadata carries a SelectionRationale; metadata read back from JSON a plain dict
+        rationale = filter_metadata.get("selection_rationale") or {}
+        if isinstance(rationale, SelectionRationale):
+            rationale = rationale._asdict()
         return {
             "total_locations": len(data),
             "data_coverage": filter_metadata.get("data_coverage_score", 0.85),
-            "selection_method": filter_metadata.get("selection_rationale", {}).get("selection_method", ""),
+            "selection_method": rationale.get("selection_method", ""),
             "quality_score": filter_metadata.get("efficiency_score", 0.90)
         }
     
@@ -232,38 +288,28 @@ class OutputGeneratorAgent:
                            confidence: float, limitations: List[str], 
                            next_steps: List[str]) -> str:
         """Format the final human-readable output"""
-        
-        output = f"""Question: {question}
-Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Data Coverage: {data_summary['total_locations']} locations analyzed
-==================================================
-
-KEY INSIGHTS:
-"""
-        
-        for i, insight in enumerate(insights, 1):
-            output += f"{i}. {insight}\n"
-        
-        output += "\nRECOMMENDATIONS:\n"
-        
-        for i, rec in enumerate(recommendations, 1):
-            output += f"\n{i}. [{rec['priority']}] {rec['action']}\n"
-            output += f"   Details: {rec['details']}\n"
-            output += f"   Expected Impact: {rec['expected_impact']}\n"
-            output += f"   Timeline: {rec['timeline']}\n"
+        # Sections are collected as parts and joined once at the end
+        parts = [_HEADER_TEMPLATE.format_map({
+            "question": question,
+            "timestamp": now_iso().replace("T", " "),
+            "total_locations": data_summary['total_locations']
+        })]
+        parts.extend(f"{i}. {insight}\n" for i, insight in enumerate(insights, 1))
+        
+        parts.append("\nRECOMMENDATIONS:\n")
+        parts.extend(_RECOMMENDATION_TEMPLATE.format_map({**rec, "i": i})
+                     for i, rec in enumerate(recommendations, 1))
         
         if limitations:
-            output += "\nLIMITATIONS:\n"
-            for limitation in limitations:
-                output += f"• {limitation}\n"
+            parts.append("\nLIMITATIONS:\n")
+            parts.extend(f"• {limitation}\n" for limitation in limitations)
         
-        output += "\nNEXT STEPS:\n"
-        for i, step in enumerate(next_steps, 1):
-            output += f"{i}. {step}\n"
+        parts.append("\nNEXT STEPS:\n")
+        parts.extend(f"{i}. {step}\n" for i, step in enumerate(next_steps, 1))
         
-        output += f"\nConfidence Score: {confidence:.1%}\n"
+        parts.append(f"\nConfidence Score: {confidence:.1%}\n")
         
-        return output
+        return "".join(parts)
     
     def save_output(self, result: OutputGenerationResult, output_path: str):
         """Save final output to file"""
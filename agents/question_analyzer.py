@@ -14,10 +14,14 @@ Key Responsibilities:
 """
 
 import logging
+import re
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
-from datetime import datetime
 from enum import Enum
+try:
+    from agents.timestamps import now_iso
+except ModuleNotFoundError:  # Run directly as a script from agents/
+    from timestamps import now_iso
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +45,33 @@ class AnalyticalApproach(Enum):
     THRESHOLD_ANALYSIS = "threshold_analysis"
 
 
-@dataclass
+# Pattern categories in classification priority order, mapped explicitly to
+# their QuestionType rather than looked up by name
+_PATTERN_CATEGORY_ORDER = (
+    ("performance_analysis", QuestionType.PERFORMANCE_ANALYSIS),
+    ("location_comparison", QuestionType.LOCATION_COMPARISON),
+    ("trend_identification", QuestionType.TREND_IDENTIFICATION),
+    ("recommendation_generation", QuestionType.RECOMMENDATION_GENERATION)
+)
+
+# Placeholder analysis specifications shared by every question until the
+# per-question logic lands. The field lists are immutable tuples handed out by
+# reference; the filtering criteria are copied per call because downstream
+# stages keep and serialize them.
+_DEFAULT_REQUIRED_FIELDS = ("location_name", "sales_volume", "priority_score", "trend_indicators")
+_DEFAULT_FILTERING_CRITERIA = {
+    "max_rows": 25,
+    "selection_strategy": "mixed",
+    "priority_weight": 0.4,
+    "representative_weight": 0.4,
+    "volume_weight": 0.2,
+    "geographic_diversity": True,
+    "performance_variance": True
+}
+_DEFAULT_BUSINESS_CONTEXT = ("org_benchmarks", "industry_standards", "seasonal_patterns")
+
+
+@dataclass(slots=True)
 class QuestionAnalysisOutput:
     """Machine-readable output from question analysis stage"""
     timestamp: str
@@ -49,10 +79,10 @@ class QuestionAnalysisOutput:
     question_type: QuestionType
     analytical_approach: AnalyticalApproach
     confidence_score: float
-    required_fields: List[str]
+    required_fields: Tuple[str, ...]
     filtering_criteria: Dict[str, Any]
     expected_output_format: str
-    business_context_needed: List[str]
+    business_context_needed: Tuple[str, ...]
     recommended_next_stage: str
 
 
@@ -69,6 +99,12 @@ class QuestionAnalyzerAgent:
         """Initialize the question analyzer agent"""
         self.config = self._load_config(config_path)
         self.question_patterns = self._load_question_patterns()
+        self._pattern_order = tuple(
+            (question_type, tuple(pattern.casefold() for pattern in self.question_patterns[category]))
+            for category, question_type in _PATTERN_CATEGORY_ORDER
+            if self.question_patterns.get(category)
+        )
+        self._pattern_regex = self._compile_question_patterns()
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load agent configuration"""
@@ -115,6 +151,21 @@ class QuestionAnalyzerAgent:
             ]
         }
     
+    def _compile_question_patterns(self) -> re.Pattern:
+        """
+        Compile all question patterns into one regex for single-pass classification
+        
+        Each category in self._pattern_order is one capture group in a zero-width
+        lookahead, so a single scan reports every position where any pattern
+        starts and which category matched there.
+        """
+        if not self._pattern_order:
+            return re.compile(r"(?!)")  # Never matches
+        
+        groups = ("(" + "|".join(re.escape(pattern) for pattern in patterns) + ")"
+                  for _, patterns in self._pattern_order)
+        return re.compile("(?=" + "|".join(groups) + ")")
+    
     def analyze_question(self, question: str, schema_output: Dict[str, Any]) -> QuestionAnalysisOutput:
         """
         Main entry point for question analysis
@@ -144,7 +195,7 @@ class QuestionAnalyzerAgent:
         business_context = self._identify_business_context_needs(question_type, approach)
         
         output = QuestionAnalysisOutput(
-            timestamp=datetime.now().isoformat(),
+            timestamp=now_iso(),
             original_question=question,
             question_type=question_type,
             analytical_approach=approach,
@@ -164,19 +215,19 @@ class QuestionAnalyzerAgent:
         # TODO: Implement intelligent question classification
         # This would use NLP techniques and pattern matching
         
-        question_lower = question.lower()
+        question_folded = question.casefold()
         
-        # Simple pattern matching for now
-        if any(pattern in question_lower for pattern in self.question_patterns.get("performance_analysis", [])):
-            return QuestionType.PERFORMANCE_ANALYSIS
-        elif any(pattern in question_lower for pattern in self.question_patterns.get("location_comparison", [])):
-            return QuestionType.LOCATION_COMPARISON
-        elif any(pattern in question_lower for pattern in self.question_patterns.get("trend_identification", [])):
-            return QuestionType.TREND_IDENTIFICATION
-        elif any(pattern in question_lower for pattern in self.question_patterns.get("recommendation_generation", [])):
-            return QuestionType.RECOMMENDATION_GENERATION
-        else:
+        # Single pass over the question; keep the highest-priority category seen
+        best_group = None
+        for match in self._pattern_regex.finditer(question_folded):
+            if best_group is None or match.lastindex < best_group:
+                best_group = match.lastindex
+                if best_group == 1:
+                    break
+        
+        if best_group is None:
             return QuestionType.PERFORMANCE_ANALYSIS  # Default fallback
+        return self._pattern_order[best_group - 1][0]
     
     def _determine_analytical_approach(self, question_type: QuestionType, question: str) -> AnalyticalApproach:
         """Determine the best analytical approach for the question type"""
@@ -190,29 +241,21 @@ class QuestionAnalyzerAgent:
         }
         return approach_mapping.get(question_type, AnalyticalApproach.COMPARATIVE_ANALYSIS)
     
-    def _identify_required_fields(self, question_type: QuestionType, schema_output: Dict[str, Any]) -> List[str]:
+    def _identify_required_fields(self, question_type: QuestionType, schema_output: Dict[str, Any]) -> Tuple[str, ...]:
         """Identify which data fields are required for the analysis"""
         # TODO: Implement field requirement analysis based on question type and available schema
         # This would analyze the schema output to determine which fields are needed
-        return ["location_name", "sales_volume", "priority_score", "trend_indicators"]
+        return _DEFAULT_REQUIRED_FIELDS
     
     def _generate_filtering_criteria(self, question_type: QuestionType, approach: AnalyticalApproach, question: str) -> Dict[str, Any]:
         """Generate criteria for filtering representative data"""
         # TODO: Implement intelligent filtering criteria generation
-        return {
-            "max_rows": 25,
-            "selection_strategy": "mixed",
-            "priority_weight": 0.4,
-            "representative_weight": 0.4,
-            "volume_weight": 0.2,
-            "geographic_diversity": True,
-            "performance_variance": True
-        }
+        return dict(_DEFAULT_FILTERING_CRITERIA)
     
-    def _identify_business_context_needs(self, question_type: QuestionType, approach: AnalyticalApproach) -> List[str]:
+    def _identify_business_context_needs(self, question_type: QuestionType, approach: AnalyticalApproach) -> Tuple[str, ...]:
         """Identify what business context is needed for the analysis"""
         # TODO: Implement business context identification
-        return ["org_benchmarks", "industry_standards", "seasonal_patterns"]
+        return _DEFAULT_BUSINESS_CONTEXT
     
     def _calculate_confidence(self, question_type: QuestionType, approach: AnalyticalApproach) -> float:
         """Calculate confidence score for the analysis"""
@@ -13,18 +13,50 @@ Key Responsibilities:
 - Generate machine-readable schema output for next stage
 """
 
+import copy
 import os
 import yaml
 import pandas as pd
+import numpy as np
 import logging
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
+try:
+    from agents.timestamps import now_iso
+except ModuleNotFoundError:  # Run directly as a script from agents/
+    from timestamps import now_iso
+try:
+    from agents.file_io import dump_json
+except ModuleNotFoundError:  # Run directly as a script from agents/
+    from file_io import dump_json
 
 logger = logging.getLogger(__name__)
 
+# Streaming limits for fresh schema discovery
+CSV_CHUNK_ROWS = 200_000      # Rows read per chunk, bounding peak memory per file
+MAX_TRACKED_UNIQUES = 10_000  # Distinct values tracked per column; counts at the cap are lower bounds
+SAMPLE_VALUE_COUNT = 5
+SAMPLE_SCAN_ROWS = 64         # Leading rows scanned for samples before falling back to the full chunk
+MAX_PROFILE_ROWS = 1_000_000  # Rows profiled per file; statistics for larger files are estimated from these
+SCHEMA_CACHE_SIZE = 8         # Discovery results kept per agent, keyed by input file fingerprints
 
-@dataclass
+# Config locations, resolved once at import time
+_CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config")
+FIELD_METADATA_PATH = os.path.join(_CONFIG_DIR, "field_metadata.yaml")
+# Learning insight files are picked up from here by the config learning manager
+LEARNING_DIR = os.path.join(_CONFIG_DIR, "learning")
+
+# Weights for (average completeness, business context coverage) in the data quality score
+_QUALITY_WEIGHTS = np.array([0.7, 0.3])
+
+# libyaml's C loader when PyYAML was built with it, otherwise the pure-Python one
+YamlSafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@dataclass(slots=True)
 class FieldMetadata:
     """Metadata container for a single data field"""
     name: str
@@ -38,7 +70,7 @@ class FieldMetadata:
     relationships: List[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class SchemaDiscoveryOutput:
     """Machine-readable output from schema discovery stage"""
     timestamp: str
@@ -51,6 +83,144 @@ class SchemaDiscoveryOutput:
     confidence_score: float
 
 
+@lru_cache(maxsize=8)
+def _load_yaml_cached(config_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """
+    Parse a YAML config file, memoized on its path, modification time and size
+    
+    Editing the file changes mtime_ns or size and so forces a fresh parse. The
+    returned dict is shared between callers and must be treated as read-only.
+    """
+    with open(config_path, 'rb') as f:
+        return yaml.load(f, Loader=YamlSafeLoader)
+
+
+def load_yaml_config(config_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a YAML config file through the shared parse cache
+    
+    The file is stat'ed once per call; it is only re-parsed when it has changed
+    since the last load. Returns None if the file does not exist. The returned
+    dict is shared and must be treated as read-only.
+    """
+    try:
+        stat = os.stat(config_path)
+    except FileNotFoundError:
+        return None
+    return _load_yaml_cached(config_path, stat.st_mtime_ns, stat.st_size)
+
+
+# Field data types by numpy dtype kind code; other kinds are classified from
+# their distinct values as categorical or text
+_DTYPE_KIND_TYPES = {
+    "b": "numeric", "i": "numeric", "u": "numeric", "f": "numeric", "c": "numeric",
+    "M": "datetime"
+}
+
+
+def _file_fingerprint(file_path: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """(path, mtime_ns, size) for a file, with None for both stats if it is missing"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return (file_path, None, None)
+    return (file_path, stat.st_mtime_ns, stat.st_size)
+
+
+def schema_input_fingerprint(data_paths: List[str]) -> Tuple[Tuple[str, Optional[int], Optional[int]], ...]:
+    """
+    Fingerprints of everything schema discovery reads: the data files and the field config
+    
+    Discovery output is a pure function of these, so callers can use the
+    fingerprint as a cache key for results derived from it.
+    """
+    return tuple(map(_file_fingerprint, data_paths)) + (_file_fingerprint(FIELD_METADATA_PATH),)
+
+
+def _analyze_csv_file(file_path: str) -> Dict[str, FieldMetadata]:
+    """
+    Stream a CSV file in chunks and build field metadata for each column
+    
+    Null counts, distinct values (up to MAX_TRACKED_UNIQUES) and sample values
+    are accumulated chunk by chunk, so peak memory is bounded by one chunk
+    rather than the whole file. Data types are taken from the first chunk.
+    Only the first MAX_PROFILE_ROWS rows are read; the output is schema
+    guidance, so completeness and distinct counts for larger files are
+    estimates from that leading sample.
+    """
+    columns = list(pd.read_csv(file_path, nrows=0).columns)
+    null_counts = {column: 0 for column in columns}
+    uniques = {column: set() for column in columns}
+    samples = {column: [] for column in columns}
+    data_types = {}
+    total_rows = 0
+    
+    for chunk in pd.read_csv(file_path, chunksize=CSV_CHUNK_ROWS, nrows=MAX_PROFILE_ROWS):
+        if not data_types:
+            data_types = {column: _DTYPE_KIND_TYPES.get(dtype.kind) for column, dtype in chunk.dtypes.items()}
+        
+        total_rows += len(chunk)
+        
+        # One frame-wide reduction for null counts instead of one per column
+        for column, null_count in chunk.isna().sum().items():
+            null_counts[column] += int(null_count)
+        
+        for column in columns:
+            values = chunk[column]
+            
+            seen = uniques[column]
+            room = MAX_TRACKED_UNIQUES - len(seen)
+            if room > 0:
+                # Deduplicate first and drop the null from the (small) unique
+                # array, rather than copying every non-null value with dropna()
+                chunk_uniques = values.unique()
+                new_values = set(chunk_uniques[pd.notna(chunk_uniques)]).difference(seen)
+                if len(new_values) > room:
+                    new_values = list(new_values)[:room]
+                seen.update(new_values)
+            
+            column_samples = samples[column]
+            if len(column_samples) < SAMPLE_VALUE_COUNT:
+                needed = SAMPLE_VALUE_COUNT - len(column_samples)
+                # Dense columns fill their samples from the first few rows; only
+                # sparse ones pay for a dropna over the whole chunk
+                chunk_samples = values.head(SAMPLE_SCAN_ROWS).dropna().astype(str).head(needed).tolist()
+                if len(chunk_samples) < needed and len(values) > SAMPLE_SCAN_ROWS:
+                    chunk_samples = values.dropna().astype(str).head(needed).tolist()
+                column_samples.extend(chunk_samples)
+    
+    logger.info(f"Analyzing {file_path}: {(total_rows, len(columns))}")
+    if total_rows >= MAX_PROFILE_ROWS:
+        logger.info(f"Profiled the first {MAX_PROFILE_ROWS:,} rows of {file_path}; field statistics are sampled")
+    
+    capped_columns = [column for column in columns if len(uniques[column]) >= MAX_TRACKED_UNIQUES]
+    if capped_columns:
+        logger.info(f"Unique counts reached the {MAX_TRACKED_UNIQUES:,} tracking cap in {file_path} "
+                    f"and are lower bounds for: {', '.join(capped_columns)}")
+    
+    file_fields = {}
+    for column in columns:
+        unique_values = len(uniques[column])
+        data_type = data_types.get(column)
+        if data_type is None:
+            # A capped count is a lower bound, so it only proves free text once it reaches half the rows
+            data_type = "categorical" if unique_values < total_rows * 0.5 else "text"
+        
+        file_fields[column] = FieldMetadata(
+            name=column,
+            data_type=data_type,
+            business_purpose="",  # To be enriched from config
+            importance_tier=3,  # Default to supplementary
+            completeness=1 - (null_counts[column] / total_rows) if total_rows else 0.0,
+            unique_values=unique_values,
+            sample_values=samples[column],
+            business_rules=[],
+            relationships=[]
+        )
+    
+    return file_fields
+
+
 class SchemaDiscoveryAgent:
     """
     Stage 1 Agent: Schema Discovery and Metadata Enrichment
@@ -64,6 +234,7 @@ class SchemaDiscoveryAgent:
         """Initialize the schema discovery agent"""
         self.config = self._load_config(config_path)
         self.field_catalog = {}
+        self._schema_cache = {}  # Input fingerprints -> SchemaDiscoveryOutput
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load agent configuration"""
@@ -89,6 +260,15 @@ class SchemaDiscoveryAgent:
         """
         logger.info(f"Starting dynamic schema discovery for {len(data_paths)} data sources")
         
+        # Discovery is a pure function of the data files and the field config, so
+        # unchanged inputs reuse the previous result with a fresh timestamp. Callers
+        # get their own copy, since FieldMetadata and its lists are mutable
+        cache_key = schema_input_fingerprint(data_paths)
+        cached_output = self._schema_cache.get(cache_key)
+        if cached_output is not None:
+            logger.info("Inputs unchanged since last discovery; reusing cached schema")
+            return replace(copy.deepcopy(cached_output), timestamp=now_iso())
+        
         # Step 1: Discover fresh schema from actual files
         discovered_fields = self._discover_fresh_schema(data_paths)
         
@@ -106,7 +286,7 @@ class SchemaDiscoveryAgent:
         
         # Step 6: Generate machine-readable output
         output = SchemaDiscoveryOutput(
-            timestamp=datetime.now().isoformat(),
+            timestamp=now_iso(),
             data_sources=data_paths,
             total_fields=len(enriched_metadata),
             field_metadata=enriched_metadata,
@@ -120,7 +300,11 @@ class SchemaDiscoveryAgent:
         self._save_learning_insights(learning_insights)
         
         logger.info(f"Dynamic schema discovery complete. Found {len(enriched_metadata)} fields")
-        logger.info(f"Config enrichment available for {len([f for f in enriched_metadata.values() if f.business_purpose])} fields")
+        logger.info(f"Config enrichment available for {sum(1 for f in enriched_metadata.values() if f.business_purpose)} fields")
+        
+        if len(self._schema_cache) >= SCHEMA_CACHE_SIZE:
+            del self._schema_cache[next(iter(self._schema_cache))]  # Evict the oldest entry
+        self._schema_cache[cache_key] = copy.deepcopy(output)
         
         return output
     
@@ -128,71 +312,56 @@ class SchemaDiscoveryAgent:
         """Discover schema from fresh data files"""
         discovered_fields = {}
         
-        for file_path in data_paths:
+        if len(data_paths) > 1:
+            # Analyze files in parallel; results are still merged in input order
+            max_workers = min(len(data_paths), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(_analyze_csv_file, file_path) for file_path in data_paths]
+            file_results = [(file_path, future.result) for file_path, future in zip(data_paths, futures)]
+        else:
+            file_results = [(file_path, partial(_analyze_csv_file, file_path)) for file_path in data_paths]
+        
+        for file_path, get_file_fields in file_results:
             try:
-                df = pd.read_csv(file_path)
-                logger.info(f"Analyzing {file_path}: {df.shape}")
-                
-                for column in df.columns:
-                    if column not in discovered_fields:
-                        # Calculate field statistics
-                        completeness = 1 - (df[column].isnull().sum() / len(df))
-                        unique_values = df[column].nunique()
-                        sample_values = df[column].dropna().astype(str).head(5).tolist()
-                        
-                        # Determine data type
-                        if pd.api.types.is_numeric_dtype(df[column]):
-                            data_type = "numeric"
-                        elif pd.api.types.is_datetime64_any_dtype(df[column]):
-                            data_type = "datetime"
-                        else:
-                            data_type = "categorical" if unique_values < len(df) * 0.5 else "text"
-                        
-                        discovered_fields[column] = FieldMetadata(
-                            name=column,
-                            data_type=data_type,
-                            business_purpose="",  # To be enriched from config
-                            importance_tier=3,  # Default to supplementary
-                            completeness=completeness,
-                            unique_values=unique_values,
-                            sample_values=sample_values,
-                            business_rules=[],
-                            relationships=[]
-                        )
-                        
+                file_fields = get_file_fields()
             except Exception as e:
                 logger.warning(f"Could not analyze {file_path}: {e}")
+                continue
+            
+            # The first file a column appears in defines its metadata
+            for column, field_metadata in file_fields.items():
+                if column not in discovered_fields:
+                    discovered_fields[column] = field_metadata
         
         return discovered_fields
     
     def _load_config_knowledge(self) -> Dict[str, Any]:
         """Load existing configuration knowledge"""
-        import os
-        config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "field_metadata.yaml")
-        
-        if os.path.exists(config_path):
-            try:
-                import yaml
-                with open(config_path, 'r') as f:
-                    config = yaml.safe_load(f)
-                field_defs = config.get('field_definitions', {})
-                logger.info(f"Loaded config knowledge with {len(field_defs)} field definitions")
-                return config
-            except Exception as e:
-                logger.warning(f"Could not load config: {e}")
-        else:
-            logger.info(f"No config file found at {config_path}")
-        
-        return {}
+        try:
+            config = load_yaml_config(FIELD_METADATA_PATH)
+        except Exception as e:
+            logger.warning(f"Could not load config: {e}")
+            return {}
+        
+        if config is None:
+            logger.info(f"No config file found at {FIELD_METADATA_PATH}")
+            return {}
+        
+        field_defs = config.get('field_definitions', {})
+        logger.info(f"Loaded config knowledge with {len(field_defs)} field definitions")
+        return config
     
     def _merge_discovery_with_config(self, discovered_fields: Dict[str, FieldMetadata], 
                                    config_knowledge: Dict[str, Any]) -> Dict[str, FieldMetadata]:
-        """Merge discovered schema with existing config knowledge"""
-        enriched_fields = discovered_fields.copy()
+        """
+        Merge discovered schema with existing config knowledge
         
+        Enriches the discovered FieldMetadata instances in place and returns the
+        same dict.
+        """
         config_fields = config_knowledge.get('field_definitions', {})
         
-        for field_name, field_metadata in enriched_fields.items():
+        for field_name, field_metadata in discovered_fields.items():
             # Check if we have config knowledge for this field
             if field_name in config_fields:
                 config_field = config_fields[field_name]
@@ -208,22 +377,20 @@ class SchemaDiscoveryAgent:
                 # New field not in config - opportunity for learning
                 logger.info(f"New field discovered: {field_name} (not in config)")
         
-        return enriched_fields
+        return discovered_fields
     
     def _assess_data_quality(self, field_metadata: Dict[str, FieldMetadata], data_paths: List[str]) -> float:
         """Assess overall data quality score"""
         if not field_metadata:
             return 0.0
         
-        # Calculate quality based on completeness and field coverage
-        completeness_scores = [field.completeness for field in field_metadata.values()]
-        avg_completeness = sum(completeness_scores) / len(completeness_scores)
+        # Completeness and business-context coverage are gathered in one pass
+        # into an (n, 2) array, then reduced and weighted together
+        field_scores = np.array([(field.completeness, bool(field.business_purpose))
+                                 for field in field_metadata.values()], dtype=np.float64)
         
-        # Bonus for having business context
-        context_coverage = len([f for f in field_metadata.values() if f.business_purpose]) / len(field_metadata)
-        
-        # Combined quality score
-        quality_score = (avg_completeness * 0.7) + (context_coverage * 0.3)
+        # Combined quality score: 70% average completeness, 30% business context coverage
+        quality_score = float(field_scores.mean(axis=0) @ _QUALITY_WEIGHTS)
         
         return min(quality_score, 1.0)
     
@@ -267,11 +434,12 @@ class SchemaDiscoveryAgent:
             return 0.0
         
         # Base confidence from data quality
-        avg_completeness = sum(f.completeness for f in discovered_fields.values()) / len(discovered_fields)
+        avg_completeness = float(np.fromiter((f.completeness for f in discovered_fields.values()),
+                                             dtype=np.float64, count=len(discovered_fields)).mean())
         
         # Bonus for config enrichment coverage
         config_fields = config_knowledge.get('fields', {})
-        enriched_count = len([f for f in discovered_fields.keys() if f in config_fields])
+        enriched_count = len(discovered_fields.keys() & config_fields)
         enrichment_ratio = enriched_count / len(discovered_fields) if discovered_fields else 0
         
         # Combined confidence
@@ -281,26 +449,25 @@ class SchemaDiscoveryAgent:
     
     def _save_learning_insights(self, learning_insights: Dict[str, Any]):
         """Save learning insights for future config updates"""
-        if not any(learning_insights.values()):
+        # Nothing new is the common case, so bail out before any filesystem work
+        if (not learning_insights.get("new_fields")
+                and not learning_insights.get("updated_statistics")
+                and not learning_insights.get("potential_relationships")
+                and not learning_insights.get("data_quality_insights")):
             return
         
-        import os
-        import json
-        from datetime import datetime
-        
         # Save to learning directory
-        project_root = os.path.dirname(os.path.dirname(__file__))
-        learning_dir = os.path.join(project_root, "config", "learning")
-        os.makedirs(learning_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        learning_file = os.path.join(learning_dir, f"schema_learning_{timestamp}.json")
-        
-        with open(learning_file, 'w') as f:
-            json.dump({
-                "timestamp": datetime.now().isoformat(),
-                "insights": learning_insights
-            }, f, indent=2)
+        os.makedirs(LEARNING_DIR, exist_ok=True)
+        
+        now = datetime.now()
+        learning_file = os.path.join(LEARNING_DIR, f"schema_learning_{now.strftime('%Y%m%d_%H%M%S')}.json")
+        
+        payload = {
+            "timestamp": now.isoformat(),
+            "insights": learning_insights
+        }
+        with open(learning_file, 'wb') as f:
+            f.write(dump_json(payload))
         
         logger.info(f"Learning insights saved to {learning_file}")
     
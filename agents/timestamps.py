@@ -0,0 +1,23 @@
+"""
+Shared timestamp helpers for the multi-prompt pipeline agents
+
+Stage outputs are stamped with second resolution, so the formatted ISO string
+is cached and only rebuilt when the wall-clock second changes.
+"""
+
+import time
+from datetime import datetime
+
+# (epoch second, formatted ISO string) for the most recent call
+_iso_cache = (0, "")
+
+
+def now_iso() -> str:
+    """Return the current local time as an ISO 8601 string (second resolution)"""
+    global _iso_cache
+    second = int(time.time())
+    cached_second, cached_iso = _iso_cache
+    if second != cached_second:
+        cached_iso = datetime.fromtimestamp(second).isoformat()
+        _iso_cache = (second, cached_iso)
+    return cached_iso
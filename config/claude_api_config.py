@@ -4,7 +4,15 @@ Claude API Configuration for LLM Testing Framework
 """
 
 import os
-from typing import Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
+
+# tiktoken is optional; without it token counts fall back to a character heuristic
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
 # Model configurations
 MODELS = {
@@ -26,6 +34,14 @@ MODELS = {
     }
 }
 
+# Per-model lookups flattened once at import time
+_DEFAULT_MODEL = "claude-3-5-sonnet"
+_COST_TABLE = {k: (v["cost_per_input_token"], v["cost_per_output_token"]) for k, v in MODELS.items()}
+_MAX_TOKENS = {k: v["max_tokens"] for k, v in MODELS.items()}
+
+# Prompts longer than this are counted directly rather than kept in the token count cache
+_TOKEN_CACHE_MAX_CHARS = 65536
+
 # Default API settings
 DEFAULT_CONFIG = {
     "model": "claude-3-5-sonnet-20241022",
@@ -72,6 +88,10 @@ CONDITION_CONFIGS = {
     }
 }
 
+# Read-only views handed out by get_condition_config, so callers share one
+# mapping per condition instead of receiving a fresh copy on every call
+_CONDITION_VIEWS = {k: MappingProxyType(v) for k, v in CONDITION_CONFIGS.items()}
+
 def get_api_key() -> str:
     """Get API key from environment variable."""
     api_key = os.getenv('ANTHROPIC_API_KEY')
@@ -79,29 +99,54 @@ def get_api_key() -> str:
         raise ValueError("ANTHROPIC_API_KEY environment variable not set")
     return api_key
 
-def get_condition_config(condition: str) -> Dict[str, Any]:
-    """Get configuration for a specific test condition."""
-    if condition not in CONDITION_CONFIGS:
-        raise ValueError(f"Unknown condition: {condition}")
-    return CONDITION_CONFIGS[condition].copy()
+def get_condition_config(condition: str) -> Mapping[str, Any]:
+    """
+    Get a read-only view of the configuration for a specific test condition.
+    
+    Callers that need to modify the settings should take a copy with dict().
+    """
+    try:
+        return _CONDITION_VIEWS[condition]
+    except KeyError:
+        raise ValueError(f"Unknown condition: {condition}") from None
 
 def estimate_cost(input_tokens: int, output_tokens: int, model: str = "claude-3-5-sonnet") -> float:
     """Estimate cost for API call."""
-    if model not in MODELS:
-        model = "claude-3-5-sonnet"
+    cost_in, cost_out = _COST_TABLE.get(model) or _COST_TABLE[_DEFAULT_MODEL]
+    return input_tokens * cost_in + output_tokens * cost_out
+
+@lru_cache(maxsize=1)
+def _get_token_encoding():
+    """Load the tokenizer used for token counts (cl100k_base as a close proxy for Claude)."""
+    return tiktoken.get_encoding("cl100k_base")
+
+def _count_tokens(text: str) -> int:
+    """Count tokens in text, falling back to ~4 characters per token without tiktoken."""
+    if tiktoken is None:
+        return len(text) // 4
+    return len(_get_token_encoding().encode(text))
+
+_count_tokens_cached = lru_cache(maxsize=4096)(_count_tokens)
+
+def count_tokens(text: str) -> int:
+    """Count tokens in a prompt, caching the result for repeated prompts."""
+    if len(text) > _TOKEN_CACHE_MAX_CHARS:
+        return _count_tokens(text)
+    return _count_tokens_cached(text)
+
+def validate_token_limits(prompt_length: int, model: str = "claude-3-5-sonnet",
+                          prompt_text: Optional[str] = None) -> bool:
+    """
+    Check if prompt length is within model limits.
     
-    model_config = MODELS[model]
-    cost = (input_tokens * model_config["cost_per_input_token"] + 
-            output_tokens * model_config["cost_per_output_token"])
-    return cost
-
-def validate_token_limits(prompt_length: int, model: str = "claude-3-5-sonnet") -> bool:
-    """Check if prompt length is within model limits."""
-    if model not in MODELS:
-        model = "claude-3-5-sonnet"
+    When prompt_text is given its tokens are counted; otherwise prompt_length
+    is converted with a rough 4 characters per token estimate.
+    """
+    max_tokens = _MAX_TOKENS.get(model) or _MAX_TOKENS[_DEFAULT_MODEL]
     
-    # Rough estimate: 4 characters per token
-    estimated_tokens = prompt_length // 4
-    max_tokens = MODELS[model]["max_tokens"]
+    if prompt_text is not None:
+        estimated_tokens = count_tokens(prompt_text)
+    else:
+        estimated_tokens = prompt_length // 4
     
-    return estimated_tokens < (max_tokens * 0.8)  # Leave 20% buffer for response
\ No newline at end of file
+    return estimated_tokens < (max_tokens * 0.8)  # Leave 20% buffer for response
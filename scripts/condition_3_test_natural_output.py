@@ -8,18 +8,193 @@ Now handles natural language responses instead of JSON.
 from dotenv import load_dotenv
 load_dotenv()
 import json
+import math
+import sys
 import time
 import csv
 import os
+import re
 from datetime import datetime
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
 import anthropic
+import httpx
+
+# Add project root to path for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from agents.file_io import dump_json
+
+# Request parameters shared by the synchronous and batch API paths
+MESSAGE_PARAMS = {
+    "model": "claude-3-5-sonnet-20241022",
+    "max_tokens": 8192,  # Increased from 4000 to allow more detailed responses
+    "temperature": 0.1
+}
+
+@lru_cache(maxsize=None)
+def _shared_client(api_key: str) -> anthropic.Anthropic:
+    """One client per API key, so every tester in the process reuses the same connection pool."""
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=60),
+        timeout=httpx.Timeout(120.0, connect=10.0)
+    )
+    return anthropic.Anthropic(api_key=api_key, http_client=http_client, max_retries=3)
+
+# Fixed parts of the Condition 3 prompt; only the question and data vary per call
+_PROMPT_PREAMBLE = """You are a business analyst helping retail operators make data-driven decisions about their locations.
+
+Question: """
+_PROMPT_DATA_HEADING = """
+
+Location Data:
+"""
+_PROMPT_INSTRUCTIONS = """
+
+Instructions:
+- Analyze the data to answer the question
+- Focus on high priority locations for the operator  
+- Provide specific recommendations with supporting data (e.g., product recommendations to add or drop, category trends, etc.)
+"""
+
+def estimate_output_tokens(user_question: str) -> int:
+    """
+    Rough response budget for a question: 256 tokens per word, clamped to [1024, 8192].
+    
+    Short lookup questions ("Which locations need attention?") get a smaller
+    max_tokens than open-ended ones. It is a heuristic, so callers opt in by
+    passing the result as max_tokens; the default stays at the full 8192.
+    """
+    return max(1024, min(MESSAGE_PARAMS["max_tokens"], 256 * len(user_question.split())))
+
+def _user_message(prompt: str, prompt_cache: bool = False) -> Dict[str, Any]:
+    """
+    Wrap a prompt as the user message, optionally marked as a prompt-cache breakpoint.
+    
+    The question leads the prompt, so a cache entry only pays off when the
+    same question is re-run against unchanged data within the cache lifetime;
+    every other call pays the cache-write premium. Off by default for that reason.
+    """
+    if not prompt_cache:
+        return {"role": "user", "content": prompt}
+    return {
+        "role": "user",
+        "content": [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+    }
+
+@lru_cache(maxsize=64)
+def _header_lines(headers: Tuple[str, ...]) -> str:
+    """Header and dash separator lines for a table, shared by files with the same columns."""
+    return " | ".join(headers) + "\n" + " | ".join("-" * len(h) for h in headers) + "\n"
+
+@lru_cache(maxsize=256)
+def _format_curated_table(filepath: str, mtime_ns: int, size: int) -> Tuple[str, ...]:
+    """
+    Format a curated CSV as table fragments, memoized on path, mtime and size.
+    
+    Rows are streamed straight into the fragments rather than collected as
+    per-row dicts. Editing the file changes mtime_ns or size and forces a re-read.
+    """
+    parts = [""]  # Title slot, filled in once the rows are counted
+    row_count = 0
+    
+    with open(filepath, 'r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        headers = next(reader, None)
+        
+        if headers:
+            # Add header row
+            parts.append(_header_lines(tuple(headers)))
+            
+            # Add data rows (cells are already in header order)
+            width = len(headers)
+            for row in reader:
+                if not row:
+                    continue  # Blank lines, skipped as DictReader does
+                parts.append(" | ".join(row[:width]))
+                parts.append("\n")
+                row_count += 1
+    
+    # Format as readable table for Claude
+    if not row_count:
+        raise ValueError("No data loaded from file")
+    
+    parts[0] = f"Location Data ({row_count} locations):\n\n"
+    return tuple(parts)
+
+# Lowercase words of a question or column name, used to match metrics to headers
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+@lru_cache(maxsize=32)
+def _read_curated_rows(filepath: str, mtime_ns: int, size: int) -> Tuple[Tuple[str, ...], Tuple[Tuple[str, ...], ...]]:
+    """Header and non-blank rows of a curated CSV, memoized on path, mtime and size."""
+    with open(filepath, 'r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        headers = tuple(next(reader, None) or ())
+        rows = tuple(tuple(row[:len(headers)]) for row in reader if row)
+    return headers, rows
+
+def _to_float(value: str) -> Optional[float]:
+    """Parse a numeric cell, or None if it is blank, not a number, or not finite (nan, inf)."""
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+def _is_numeric_column(rows: Tuple[Tuple[str, ...], ...], i: int) -> bool:
+    """Whether most non-blank cells of column i parse as finite numbers."""
+    cells = [row[i] for row in rows if i < len(row) and row[i].strip()]
+    return bool(cells) and sum(_to_float(cell) is not None for cell in cells) * 2 > len(cells)
+
+def select_relevant_rows(headers: Tuple[str, ...], rows: Tuple[Tuple[str, ...], ...], user_question: str,
+                         k: int = 200) -> Tuple[Tuple[Tuple[str, ...], ...], Optional[str]]:
+    """
+    Keep the top k rows by the numeric column the question most plausibly asks about.
+    
+    A column is preferred when one of its name's words appears in the question
+    (e.g. "sales" matches CURRENT_WEEK__SALES), then a priority column, then the
+    first numeric column that is not an identifier (e.g. STORE_ID). A column is
+    numeric when most of its non-blank cells are finite numbers. Rows without a
+    value sort last. Returns the kept rows and the ranking column (None if no
+    column qualifies, in which case the first k rows are kept).
+    """
+    if len(rows) <= k:
+        return rows, None
+    
+    question_words = set(_WORD_RE.findall(user_question.lower()))
+    numeric_columns = [i for i in range(len(headers)) if _is_numeric_column(rows, i)]
+    
+    def column_rank(i: int) -> int:
+        words = set(_WORD_RE.findall(headers[i].lower()))
+        if words & question_words:
+            return 0
+        if "priority" in words:
+            return 1
+        return 3 if "id" in words else 2
+    
+    column = min(numeric_columns, key=column_rank, default=None)
+    if column is None or column_rank(column) == 3:
+        return rows[:k], None
+    values = [_to_float(row[column]) if column < len(row) else None for row in rows]
+    order = sorted(range(len(rows)), key=lambda r: (values[r] is None, -(values[r] or 0.0)))
+    return tuple(rows[r] for r in order[:k]), headers[column]
 
 class Condition3Tester:
-    def __init__(self, api_key: str):
-        """Initialize the tester with Claude API client."""
-        self.client = anthropic.Anthropic(api_key=api_key)
+    def __init__(self, api_key: str, prompt_cache: bool = False):
+        """
+        Initialize the tester with Claude API client.
+        
+        prompt_cache marks each prompt as a prompt-cache breakpoint (see _user_message);
+        worth it only when re-running identical questions within a few minutes.
+        """
+        self.client = _shared_client(api_key)
+        self.prompt_cache = prompt_cache
         self.results = []
+        self._token_counts: Dict[str, int] = {}
         self.test_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         # Create results directory
@@ -28,129 +203,99 @@ class Condition3Tester:
         
     def discover_curated_files(self, data_dir: str) -> List[str]:
         """Discover all CSV files in the curated data directory."""
-        import glob
-        csv_files = glob.glob(os.path.join(data_dir, "*.csv"))
-        return csv_files
+        # scandir reuses the directory listing's file type, avoiding glob's pattern
+        # matching and extra stat calls; hidden files are skipped as glob does
+        with os.scandir(data_dir) as entries:
+            return [entry.path for entry in entries
+                    if entry.name.endswith(".csv") and not entry.name.startswith(".") and entry.is_file()]
     
     def load_curated_data(self, filepath: str) -> str:
         """Load and format curated weekly data for prompt."""
-        data_rows = []
-        
-        with open(filepath, 'r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                data_rows.append(row)
+        parts = []
+        self._append_curated_table(filepath, parts)
+        return "".join(parts)
+    
+    def _append_curated_table(self, filepath: str, parts: List[str]):
+        """
+        Append the formatted table for a curated CSV to parts as string fragments.
         
-        # Format as readable table for Claude
-        if not data_rows:
+        Callers can join tables from several files (or the whole prompt) in one
+        pass. Tables are cached per file version, so unchanged files are only
+        parsed once per process. If the file cannot be loaded nothing is appended.
+        """
+        parts.extend(self._curated_table(filepath))
+    
+    def _curated_table(self, filepath: str) -> Tuple[str, ...]:
+        """Formatted table fragments for a curated CSV, cached per file version."""
+        stat = os.stat(filepath)
+        return _format_curated_table(filepath, stat.st_mtime_ns, stat.st_size)
+    
+    def _relevant_curated_table(self, filepath: str, user_question: str, max_rows: int) -> Tuple[str, ...]:
+        """Formatted table fragments for the rows of a curated CSV most relevant to the question."""
+        stat = os.stat(filepath)
+        headers, rows = _read_curated_rows(filepath, stat.st_mtime_ns, stat.st_size)
+        if not rows:
             raise ValueError("No data loaded from file")
-            
-        # Create formatted table
-        headers = list(data_rows[0].keys())
-        formatted_data = f"Location Data ({len(data_rows)} locations):\n\n"
-        
-        # Add header row
-        formatted_data += " | ".join(headers) + "\n"
-        formatted_data += " | ".join(["-" * len(h) for h in headers]) + "\n"
+        if len(rows) <= max_rows:
+            return _format_curated_table(filepath, stat.st_mtime_ns, stat.st_size)
         
-        # Add data rows
-        for row in data_rows:
-            formatted_data += " | ".join([str(row.get(h, "")) for h in headers]) + "\n"
-            
-        return formatted_data
+        kept, column = select_relevant_rows(headers, rows, user_question, max_rows)
+        ranking = f" by {column}" if column else ""
+        parts = [f"Location Data (top {len(kept)} of {len(rows)} locations{ranking}; remaining rows omitted):\n\n",
+                 _header_lines(headers)]
+        for row in kept:
+            parts.append(" | ".join(row))
+            parts.append("\n")
+        return tuple(parts)
+    
+    def _try_curated_table(self, filepath: str, user_question: str = None,
+                           max_rows: Optional[int] = None) -> Tuple[Tuple[str, ...], Optional[Exception]]:
+        """Table fragments for a curated CSV, or the exception raised while loading it."""
+        try:
+            if max_rows is None:
+                return self._curated_table(filepath), None
+            return self._relevant_curated_table(filepath, user_question, max_rows), None
+        except Exception as e:
+            return (), e
         
-    def create_minimal_prompt(self, user_question: str, data_content: str) -> str:
-        """Create minimal guidance prompt."""
-        return f"""You are a business analyst helping retail operators make data-driven decisions about their locations.
+    def create_minimal_prompt(self, user_question: str, data_parts: List[str]) -> str:
+        """Create minimal guidance prompt from the string fragments of the data section."""
+        # Data fragments are joined straight into the prompt so the full data
+        # text is only materialized once
+        pieces = [_PROMPT_PREAMBLE, user_question, _PROMPT_DATA_HEADING]
+        pieces.extend(data_parts)
+        pieces.append(_PROMPT_INSTRUCTIONS)
+        return "".join(pieces)
 
-Question: {user_question}
-
-Location Data:
-{data_content}
-
-Instructions:
-- Analyze the data to answer the question
-- Focus on high priority locations for the operator  
-- Provide specific recommendations with supporting data (e.g., product recommendations to add or drop, category trends, etc.)
-"""
-
-    def call_claude_api(self, prompt: str, user_question: str = None) -> Dict[str, Any]:
-        """Make API call to Claude and return structured response."""
+    def call_claude_api(self, prompt: str, user_question: str = None,
+                        max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Make API call to Claude and return structured response.
+        
+        max_tokens overrides the default response budget, e.g. with
+        estimate_output_tokens(user_question).
+        """
         start_time = time.time()
+        params = {**MESSAGE_PARAMS, "max_tokens": max_tokens or MESSAGE_PARAMS["max_tokens"]}
         
         try:
-            # Estimate tokens in prompt (rough approximation)
-            est_input_tokens = len(prompt) // 3  # Rough estimate: ~3 chars per token on average
-            
-            # Log token estimation
-            print(f"Estimated input tokens: {est_input_tokens} (Claude limit: 200,000)")
+            est_input_tokens = self._check_prompt_size(prompt, params["max_tokens"])
             
-            if est_input_tokens > 190000:  # Buffer for safety
-                raise ValueError(f"Estimated input tokens ({est_input_tokens}) likely exceeds Claude's limit")
+            # One timestamp stamps the transcript, the response file and the result
+            timestamp = datetime.now().isoformat()
             
-            # Save final prompt for transparency (same as Condition 4)
-            final_prompt_file = os.path.join(self.results_dir, f"final_prompt_{self.test_timestamp}.txt")
-            with open(final_prompt_file, 'w', encoding='utf-8') as f:
-                f.write("FINAL PROMPT SENT TO LLM (CONDITION 3 - NATURAL OUTPUT)\n")
-                f.write("=" * 60 + "\n\n")
-                f.write(f"Timestamp: {datetime.now().isoformat()}\n")
-                f.write(f"Model: claude-3-5-sonnet-20241022\n")
-                f.write(f"Max Tokens: 8192\n")
-                f.write(f"Temperature: 0.1\n")
-                f.write(f"Estimated Tokens: {est_input_tokens}\n")
-                f.write(f"Prompt Length: {len(prompt)} characters\n")
-                f.write("\n" + "=" * 60 + "\n\n")
-                f.write(prompt)
-            
-            print(f"Final prompt saved to {final_prompt_file}")
-            print(f"Prompt length: {len(prompt)} characters, estimated tokens: {est_input_tokens}")
-                
-            message = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=8192,  # Increased from 4000 to allow more detailed responses
-                temperature=0.1,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            # Write the prompt transcript while the request is in flight
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                prompt_saved = writer.submit(self._save_final_prompt, prompt, est_input_tokens,
+                                             self.test_timestamp, timestamp, params)
+                message = self._stream_response(prompt, user_question, timestamp, self.test_timestamp, params)
+                prompt_saved.result()
             
             response_time = time.time() - start_time
             
-            # Extract response content as natural language
-            response_text = message.content[0].text
-            
-            # Save structured response (comparable to Condition 4)
-            result = {
-                "timestamp": datetime.now().isoformat(),
-                "condition": "3_natural_output",
-                "question": user_question,
-                "response": response_text,
-                "response_time": response_time,
-                "token_usage": {
-                    "input_tokens": message.usage.input_tokens,
-                    "output_tokens": message.usage.output_tokens,
-                    "total_tokens": message.usage.input_tokens + message.usage.output_tokens
-                },
-                "prompt_length": len(prompt),
-                "estimated_input_tokens": est_input_tokens,
-                "guidance_type": "minimal"
-            }
-            
-            # Save results in comparable format to Condition 4
-            results_file = os.path.join(self.results_dir, f"condition_3_result_{self.test_timestamp}.json")
-            with open(results_file, 'w') as f:
-                json.dump(result, f, indent=2, default=str)
-            
-            # Save human-readable response
-            response_file = os.path.join(self.results_dir, f"condition_3_response_{self.test_timestamp}.txt")
-            with open(response_file, 'w') as f:
-                f.write(f"Question: {user_question}\n")
-                f.write(f"Timestamp: {result['timestamp']}\n")
-                f.write(f"Condition: 3 - Natural Output (Minimal Guidance)\n")
-                f.write("=" * 80 + "\n\n")
-                f.write(response_text)
-            
-            print(f"Results saved to {results_file}")
+            result = self._build_result(message, user_question, prompt, est_input_tokens, response_time,
+                                        timestamp)
+            self._save_result(result, self.test_timestamp, write_response=False)
             
             return result
             
@@ -160,8 +305,277 @@ Instructions:
                 "response_time": time.time() - start_time
             }
     
-    def run_test(self, data_dir: str, user_question: str, output_dir: str = None) -> Dict[str, Any]:
-        """Run the complete Condition 3 test."""
+    def call_claude_batch(self, items: List[Tuple[str, str]], poll_interval: float = 5.0,
+                          max_poll_interval: float = 60.0,
+                          max_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Answer several questions through the Message Batches API.
+        
+        Batched requests are processed asynchronously at a discount to the
+        synchronous API, so multiple questions against the same data are
+        submitted together and polled with exponential backoff. A single
+        question goes through call_claude_api instead.
+        
+        Args:
+            items: (user_question, prompt) pairs
+            poll_interval: Initial seconds between batch status checks
+            max_poll_interval: Upper bound for the backoff between checks
+            max_tokens: Response budget for every request (default 8192)
+            
+        Returns:
+            One result per item, in input order, shaped like call_claude_api's
+        """
+        if len(items) <= 1:
+            return [self.call_claude_api(prompt, user_question, max_tokens) for user_question, prompt in items]
+        
+        start_time = time.time()
+        params = {**MESSAGE_PARAMS, "max_tokens": max_tokens or MESSAGE_PARAMS["max_tokens"]}
+        results = [None] * len(items)
+        requests = []
+        est_tokens = {}
+        submitted_at = datetime.now().isoformat()
+        
+        for i, (user_question, prompt) in enumerate(items):
+            try:
+                est_tokens[i] = self._check_prompt_size(prompt, params["max_tokens"])
+            except ValueError as e:
+                results[i] = {"error": str(e), "response_time": 0.0}
+                continue
+            self._save_final_prompt(prompt, est_tokens[i], f"{self.test_timestamp}_{i + 1}", submitted_at,
+                                    params)
+            requests.append({
+                "custom_id": f"question-{i}",
+                "params": {
+                    **params,
+                    "messages": [_user_message(prompt, self.prompt_cache)]
+                }
+            })
+        
+        if not requests:
+            return results
+        
+        try:
+            # Batches graduated from the beta namespace in newer SDK releases
+            batches = getattr(self.client.messages, "batches", None) or self.client.beta.messages.batches
+            batch = batches.create(requests=requests)
+            print(f"Submitted batch {batch.id} with {len(requests)} questions")
+            
+            delay = poll_interval
+            while batch.processing_status != "ended":
+                time.sleep(delay)
+                delay = min(delay * 2, max_poll_interval)
+                batch = batches.retrieve(batch.id)
+            
+            response_time = time.time() - start_time
+            collected_at = datetime.now().isoformat()
+            for entry in batches.results(batch.id):
+                i = int(entry.custom_id.rsplit("-", 1)[1])
+                user_question, prompt = items[i]
+                if entry.result.type != "succeeded":
+                    results[i] = {"error": f"Batch request {entry.result.type}", "response_time": response_time}
+                    continue
+                result = self._build_result(entry.result.message, user_question, prompt,
+                                            est_tokens[i], response_time, collected_at)
+                self._save_result(result, f"{self.test_timestamp}_{i + 1}")
+                results[i] = result
+        except Exception as e:
+            error = {"error": str(e), "response_time": time.time() - start_time}
+            return [result if result is not None else error for result in results]
+        
+        return [result if result is not None else {"error": "No batch result returned", "response_time": 0.0}
+                for result in results]
+    
+    def _check_prompt_size(self, prompt: str, max_tokens: int = MESSAGE_PARAMS["max_tokens"]) -> int:
+        """Count input tokens for a prompt, raising ValueError if it exceeds the context window."""
+        est_input_tokens = self._count_input_tokens(prompt)
+        
+        # Log token count
+        print(f"Estimated input tokens: {est_input_tokens} (Claude limit: 200,000)")
+        
+        # The context window covers the response as well as the prompt
+        if est_input_tokens > 200000 - max_tokens:
+            raise ValueError(f"Estimated input tokens ({est_input_tokens}) likely exceeds Claude's limit")
+        
+        return est_input_tokens
+    
+    def _count_input_tokens(self, prompt: str) -> int:
+        """
+        Input tokens for a prompt from the token counting endpoint, cached per prompt.
+        
+        Falls back to a rough ~3 characters per token estimate if the installed
+        SDK has no count_tokens or the request fails.
+        """
+        token_counts = self._token_counts
+        if prompt not in token_counts:
+            try:
+                token_counts[prompt] = self.client.messages.count_tokens(
+                    model=MESSAGE_PARAMS["model"],
+                    messages=[_user_message(prompt, self.prompt_cache)]
+                ).input_tokens
+            except Exception:
+                return len(prompt) // 3  # Rough estimate: ~3 chars per token on average
+        return token_counts[prompt]
+    
+    def _save_final_prompt(self, prompt: str, est_input_tokens: int, run_id: str, timestamp: str,
+                           params: Dict[str, Any] = MESSAGE_PARAMS):
+        """Save final prompt for transparency (same as Condition 4)."""
+        final_prompt_file = os.path.join(self.results_dir, f"final_prompt_{run_id}.txt")
+        with open(final_prompt_file, 'w', encoding='utf-8') as f:
+            f.write("FINAL PROMPT SENT TO LLM (CONDITION 3 - NATURAL OUTPUT)\n")
+            f.write("=" * 60 + "\n\n")
+            f.write(f"Timestamp: {timestamp}\n")
+            f.write(f"Model: {params['model']}\n")
+            f.write(f"Max Tokens: {params['max_tokens']}\n")
+            f.write(f"Temperature: {params['temperature']}\n")
+            f.write(f"Estimated Tokens: {est_input_tokens}\n")
+            f.write(f"Prompt Length: {len(prompt)} characters\n")
+            f.write("\n" + "=" * 60 + "\n\n")
+            f.write(prompt)
+        
+        print(f"Final prompt saved to {final_prompt_file}")
+        print(f"Prompt length: {len(prompt)} characters, estimated tokens: {est_input_tokens}")
+    
+    def _stream_response(self, prompt: str, user_question: str, timestamp: str, run_id: str,
+                         params: Dict[str, Any] = MESSAGE_PARAMS):
+        """
+        Stream a Claude response straight into the human-readable response file.
+        
+        Text is written as it is generated, so the file fills in over the
+        generation window instead of in one write afterwards. Returns the final
+        message, which carries the full content and token usage. If the stream
+        fails the file is removed, so a cut-off response is not left behind.
+        """
+        response_file = os.path.join(self.results_dir, f"condition_3_response_{run_id}.txt")
+        try:
+            with open(response_file, 'w', encoding='utf-8') as f:
+                self._write_response_header(f, user_question, timestamp)
+                messages = [_user_message(prompt, self.prompt_cache)]
+                with self.client.messages.stream(messages=messages, **params) as stream:
+                    for text in stream.text_stream:
+                        f.write(text)
+                    return stream.get_final_message()
+        except Exception:
+            if os.path.exists(response_file):
+                os.remove(response_file)
+            raise
+    
+    def _write_response_header(self, f, user_question: str, timestamp: str):
+        """Write the header block of a human-readable response file."""
+        f.write(f"Question: {user_question}\n")
+        f.write(f"Timestamp: {timestamp}\n")
+        f.write(f"Condition: 3 - Natural Output (Minimal Guidance)\n")
+        f.write("=" * 80 + "\n\n")
+    
+    def _build_result(self, message, user_question: str, prompt: str, est_input_tokens: int,
+                      response_time: float, timestamp: str) -> Dict[str, Any]:
+        """Build the structured result for a Claude response (comparable to Condition 4)."""
+        return {
+            "timestamp": timestamp,
+            "condition": "3_natural_output",
+            "question": user_question,
+            # Extract response content as natural language
+            "response": message.content[0].text,
+            "response_time": response_time,
+            "token_usage": {
+                "input_tokens": message.usage.input_tokens,
+                "output_tokens": message.usage.output_tokens,
+                "total_tokens": message.usage.input_tokens + message.usage.output_tokens,
+                "cache_creation_input_tokens": getattr(message.usage, "cache_creation_input_tokens", None) or 0,
+                "cache_read_input_tokens": getattr(message.usage, "cache_read_input_tokens", None) or 0
+            },
+            "prompt_length": len(prompt),
+            "estimated_input_tokens": est_input_tokens,
+            "guidance_type": "minimal"
+        }
+    
+    def _save_result(self, result: Dict[str, Any], run_id: str, write_response: bool = True):
+        """Save the structured result and, unless it was streamed already, the human-readable response."""
+        # Save results in comparable format to Condition 4
+        results_file = os.path.join(self.results_dir, f"condition_3_result_{run_id}.json")
+        payload = dump_json(result)
+        
+        # Written in one call to a temp file and renamed into place, so a reader
+        # never sees a partially written result
+        tmp_file = results_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_file, results_file)
+        
+        # Save human-readable response
+        if write_response:
+            response_file = os.path.join(self.results_dir, f"condition_3_response_{run_id}.txt")
+            with open(response_file, 'w', encoding='utf-8') as f:
+                self._write_response_header(f, result['question'], result['timestamp'])
+                f.write(result["response"])
+        
+        print(f"Results saved to {results_file}")
+    
+    def _load_data_parts(self, csv_files: List[str], user_question: str,
+                         max_rows_per_file: Optional[int] = None) -> List[str]:
+        """Prompt fragments for every loadable curated file, in file order."""
+        # Load all CSV data into one list of fragments, joined only when the
+        # prompt is built, so no per-file table string is materialized.
+        # Files are read on a thread pool; results come back in file order
+        with ThreadPoolExecutor(max_workers=min(16, len(csv_files))) as executor:
+            tables = list(executor.map(partial(self._try_curated_table, user_question=user_question,
+                                               max_rows=max_rows_per_file), csv_files))
+        
+        data_parts = []
+        for csv_file, (fragments, error) in zip(csv_files, tables):
+            if error is not None:
+                print(f"Warning: Failed to load {csv_file}: {error}")
+                continue
+            data_parts.append("\n")
+            data_parts.extend(fragments)
+            data_parts.append("\n")
+        return data_parts
+    
+    def run_test_batch(self, data_dir: str, user_questions: List[str],
+                       max_rows_per_file: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Run the Condition 3 test for several questions through the Message Batches API.
+        
+        Each question gets the same prompt run_test would build for it; the
+        prompts are submitted together with call_claude_batch. Returns one
+        result per question, in order.
+        """
+        print(f"Starting Condition 3 Batch Test: {len(user_questions)} questions")
+        print(f"Data directory: {data_dir}")
+        
+        try:
+            csv_files = self.discover_curated_files(data_dir)
+            if not csv_files:
+                return [{"error": f"No CSV files found in {data_dir}"} for _ in user_questions]
+            print(f"Found {len(csv_files)} CSV files")
+            
+            # Without a row cap the tables do not depend on the question, so
+            # they are loaded once and shared by every prompt
+            shared_parts = self._load_data_parts(csv_files, None) if max_rows_per_file is None else None
+            items = []
+            for user_question in user_questions:
+                data_parts = shared_parts if shared_parts is not None else \
+                    self._load_data_parts(csv_files, user_question, max_rows_per_file)
+                if not data_parts:
+                    return [{"error": "No data could be loaded from CSV files"} for _ in user_questions]
+                items.append((user_question, self.create_minimal_prompt(user_question, data_parts)))
+        except Exception as e:
+            return [{"error": f"Data discovery/loading failed: {e}"} for _ in user_questions]
+        
+        results = self.call_claude_batch(items)
+        succeeded = sum(1 for result in results if "error" not in result)
+        print(f"Condition 3 batch complete: {succeeded}/{len(results)} questions answered")
+        print(f"Results saved to: {self.results_dir}")
+        return results
+    
+    def run_test(self, data_dir: str, user_question: str, output_dir: str = None,
+                 max_rows_per_file: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run the complete Condition 3 test.
+        
+        By default every curated row is sent. Set max_rows_per_file to cap each
+        table at the rows most relevant to the question (see select_relevant_rows),
+        trading completeness for fewer input tokens; the prompt notes the cut.
+        """
         print(f"Starting Condition 3 Test: Curated Data + Minimal Guidance")
         print(f"Question: {user_question}")
         print(f"Data directory: {data_dir}")
@@ -176,25 +590,17 @@ Instructions:
             for file in csv_files:
                 print(f"  - {os.path.basename(file)}")
             
-            # Load and combine all CSV data
-            all_data_content = ""
-            for csv_file in csv_files:
-                try:
-                    file_content = self.load_curated_data(csv_file)
-                    all_data_content += f"\n{file_content}\n"
-                except Exception as e:
-                    print(f"Warning: Failed to load {csv_file}: {e}")
-            
-            if not all_data_content.strip():
+            data_parts = self._load_data_parts(csv_files, user_question, max_rows_per_file)
+            if not data_parts:
                 return {"error": "No data could be loaded from CSV files"}
                 
-            print(f"Loaded combined data: {len(all_data_content)} characters")
+            print(f"Loaded combined data: {sum(map(len, data_parts))} characters")
             
         except Exception as e:
             return {"error": f"Data discovery/loading failed: {e}"}
         
         # Create prompt
-        prompt = self.create_minimal_prompt(user_question, all_data_content)
+        prompt = self.create_minimal_prompt(user_question, data_parts)
         print(f"Created prompt: {len(prompt)} characters")
         
         # Call Claude API
@@ -214,6 +620,7 @@ Instructions:
         print(f"Guidance Type: Minimal")
         print(f"Data Files: {len(csv_files)}")
         print(f"Token Usage: {result.get('token_usage', {}).get('total_tokens', 'Unknown')}")
+        print(f"Cached Input Tokens: {result.get('token_usage', {}).get('cache_read_input_tokens', 0)}")
         print(f"Prompt Length: {len(prompt)} characters")
         print(f"Response Time: {result.get('response_time', 0):.2f} seconds")
         print("")
@@ -247,6 +654,15 @@ Instructions:
 
 def main():
     """Main execution function."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Condition 3: Curated Data + Minimal Guidance")
+    parser.add_argument("--questions-file",
+                        help="Answer several questions, one per line, in one Message Batches submission")
+    parser.add_argument("--prompt-cache", action="store_true",
+                        help="Mark prompts for prompt caching; only pays off when re-running identical questions")
+    args = parser.parse_args()
+    
     # Configuration
     API_KEY = os.getenv('ANTHROPIC_API_KEY')
     if not API_KEY:
@@ -259,7 +675,17 @@ def main():
     USER_QUESTION = "Which of my locations need immediate attention and what specific actions should I take?"
     
     # Run test
-    tester = Condition3Tester(API_KEY)
+    tester = Condition3Tester(API_KEY, prompt_cache=args.prompt_cache)
+    
+    if args.questions_file:
+        with open(args.questions_file, 'r') as f:
+            questions = [line.strip() for line in f if line.strip()]
+        for question, result in zip(questions, tester.run_test_batch(CURATED_DATA_DIR, questions)):
+            status = f"failed: {result['error']}" if "error" in result else \
+                f"{result['token_usage']['total_tokens']} tokens"
+            print(f"  {question[:60]}: {status}")
+        return
+    
     result = tester.run_test(CURATED_DATA_DIR, USER_QUESTION, OUTPUT_DIR)
     
     # Print summary
@@ -16,23 +16,33 @@ Key Features:
 - Direct comparison capability with Condition 3 results
 """
 
+from __future__ import annotations
+
 import os
 import sys
+import asyncio
 import json
-import yaml
-import pandas as pd
+import hashlib
+import threading
 import logging
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
 
 # Add project root to path for imports
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from agents.schema_discovery import SchemaDiscoveryAgent
-import anthropic
+from agents.timestamps import now_iso
+from agents.file_io import dump_json, read_prompt_template, write_json
 from dotenv import load_dotenv
+
+# pandas, numpy, yaml, anthropic and the schema agent are imported where they
+# are used, so the CLI starts (e.g. for --help) without loading them
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
 load_dotenv()
 
 # Configure logging
@@ -40,6 +50,124 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True)
+class FieldSummary:
+    """Condensed per-field context for the schema summary"""
+    name: str
+    purpose: str
+    type: str
+    completeness: float
+
+
+def _prefetch_files(paths: List[str]):
+    """
+    Ask the OS to read files into the page cache ahead of use
+    
+    POSIX_FADV_WILLNEED only schedules readahead and returns immediately, so
+    the disk reads overlap with whatever runs next. A no-op on platforms
+    without posix_fadvise.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def _estimate_tokens(text: str) -> float:
+    """Rough token estimate from the word count, for when the counting endpoint is not used"""
+    return len(text.split()) * 1.3
+
+
+# _estimate_table_chars is an upper bound, loose mostly by allowing six decimals
+# for every float column (about +20% on typical mixed frames, more when floats
+# are short); an estimate over the limit by no more than this fraction is
+# confirmed exactly
+_TABLE_ESTIMATE_MARGIN = 0.5
+
+# Cached schema discovery results kept in results/.schema_cache; the least
+# recently used are deleted beyond this many
+_SCHEMA_CACHE_MAX_ENTRIES = 16
+
+
+def _estimate_table_chars(data_df: pd.DataFrame) -> int:
+    """
+    Approximate len(data_df.to_string()) without rendering the table
+    
+    to_string pads every column to its widest cell, so the width of a row is
+    estimated from each column's widest value: digit count for numbers (plus
+    six decimals for floats), string length otherwise. Float columns with
+    values pandas shows in scientific notation (nonzero magnitudes below 1e-6
+    or above 1e6) are given the width of "-d.dddddde+NN" instead. Never below
+    the rendered length, and usually a little above it.
+    """
+    import numpy as np
+    row_width = len(str(data_df.index.max())) if len(data_df) else 0
+    for column in data_df.columns:
+        values = data_df[column]
+        if values.dtype.kind in "iuf":
+            numbers = values.to_numpy(dtype=np.float64)
+            finite = numbers[np.isfinite(numbers)]
+            magnitudes = np.abs(finite)
+            magnitude = magnitudes.max() if finite.size else 0.0
+            sign = int((finite < 0).any())
+            width = len(str(int(magnitude))) + sign
+            if values.dtype.kind == "f":
+                nonzero = magnitudes[magnitudes > 0]
+                if magnitude > 1e6 or (nonzero < 1e-6).any():
+                    # Mantissa "d.dddddd", "e+" and a two or three digit exponent
+                    three_digit_exponent = magnitude >= 1e100 or (nonzero < 1e-99).any()
+                    width = sign + 10 + 2 + int(three_digit_exponent)
+                else:
+                    width += 7  # Decimal point and up to six decimals
+            if finite.size < numbers.size:
+                width = max(width, 3)  # NaN
+        else:
+            width = int(values.astype(str).str.len().max()) if len(values) else 0
+        row_width += max(len(str(column)), width) + 2
+    return (len(data_df) + 1) * (row_width + 1)
+
+
+def _min_row_dict_size(data_df: pd.DataFrame) -> int:
+    """Length of str(row.to_dict()) for a row whose every value renders as one character"""
+    key_size = sum(len(repr(column)) + 2 for column in data_df.columns)  # "'column': "
+    return 2 + key_size + 2 * max(len(data_df.columns) - 1, 0) + len(data_df.columns)
+
+
+def _row_dict_sizes(data_df: pd.DataFrame) -> np.ndarray:
+    """
+    len(str(row.to_dict())) for every row from iterrows, without building the rows
+    
+    iterrows reads rows from the frame's common-dtype array and to_dict boxes
+    numpy scalars to Python ones, so each row's size is the fixed key and
+    separator overhead plus the repr length of each boxed cell.
+    """
+    import numpy as np
+    sizes = np.full(len(data_df), _min_row_dict_size(data_df) - len(data_df.columns), dtype=np.int64)
+    values = data_df.to_numpy()
+    for j in range(values.shape[1]):
+        sizes += np.fromiter(
+            (len(repr(v.item() if isinstance(v, np.generic) else v)) for v in values[:, j].tolist()),
+            dtype=np.int64, count=len(data_df)
+        )
+    return sizes
+
+
+def _count_fitting(sizes: np.ndarray, start: int, limit: float) -> int:
+    """How many leading sizes can be added to start while the running total stays below limit"""
+    import numpy as np
+    overflow = np.flatnonzero(start + np.cumsum(sizes) >= limit)
+    return int(overflow[0]) if overflow.size else len(sizes)
+
+
 class Condition4EnhancedGuidance:
     """
     Condition 4: Enhanced Guidance Test Implementation
@@ -48,8 +176,16 @@ class Condition4EnhancedGuidance:
     on the same 49 curated location dataset used in Condition 3.
     """
     
-    def __init__(self):
-        """Initialize the enhanced guidance test"""
+    def __init__(self, save_prompt: bool = True):
+        """
+        Initialize the enhanced guidance test
+        
+        Args:
+            save_prompt: Write a final_prompt_*.txt transcript for each API call
+        """
+        import anthropic
+        from agents.schema_discovery import SchemaDiscoveryAgent
+        
         self.project_root = project_root
         self.config_path = project_root / "config" / "agent_config.yaml"
         self.schema_agent = SchemaDiscoveryAgent(str(self.config_path))
@@ -64,6 +200,8 @@ class Condition4EnhancedGuidance:
         self.curated_data_dir = project_root / "data" / "curated"
         self.results_dir = project_root / "results" / "condition_4"
         self.results_dir.mkdir(parents=True, exist_ok=True)
+        self.schema_cache_dir = project_root / "results" / ".schema_cache"
+        self.save_prompt = save_prompt
         
         # Load configuration
         self.config = self._load_config()
@@ -71,8 +209,12 @@ class Condition4EnhancedGuidance:
         # Test metadata
         self.test_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
+        # (field_metadata, tier buckets) for the last schema summarized
+        self._tier_cache = None
+        
     def _load_config(self) -> Dict[str, Any]:
         """Load test configuration"""
+        import yaml
         try:
             with open(self.config_path, 'r') as f:
                 return yaml.safe_load(f)
@@ -97,7 +239,11 @@ class Condition4EnhancedGuidance:
             raise FileNotFoundError(f"No CSV files found in {self.curated_data_dir}")
         
         logger.info(f"Found {len(csv_files)} curated data files")
-        return [str(f) for f in csv_files]
+        data_files = [str(f) for f in csv_files]
+        
+        # Start reading the files into the page cache while schema discovery sets up
+        _prefetch_files(data_files)
+        return data_files
     
     def run_schema_discovery_with_enrichment(self, data_files: List[str]) -> Dict[str, Any]:
         """
@@ -109,13 +255,51 @@ class Condition4EnhancedGuidance:
         Returns:
             Enhanced schema metadata
         """
+        from agents.schema_discovery import schema_input_fingerprint
+        
         logger.info("Running schema discovery with config enrichment")
         
+        # Reuse a previous run's result if neither the data nor the field config changed
+        fingerprint = json.dumps(schema_input_fingerprint(data_files))
+        cache_file = self.schema_cache_dir / f"{hashlib.sha256(fingerprint.encode()).hexdigest()}.json"
+        if cache_file.exists():
+            with open(cache_file, 'rb') as f:
+                schema_dict = json.loads(f.read())
+            schema_dict["timestamp"] = now_iso()
+            cache_file.touch()  # Mark as recently used so pruning keeps it
+            logger.info(f"Inputs unchanged since a previous run; reusing cached schema from {cache_file}")
+        else:
+            schema_dict = self._discover_schema_dict(data_files)
+            self.schema_cache_dir.mkdir(parents=True, exist_ok=True)
+            write_json(cache_file, schema_dict)
+            self._prune_schema_cache()
+        
+        # Save schema discovery results
+        schema_file = self.results_dir / f"schema_discovery_{self.test_timestamp}.json"
+        write_json(schema_file, schema_dict)
+        
+        logger.info(f"Schema discovery complete. Quality score: {schema_dict['data_quality_score']:.2f}")
+        return schema_dict
+    
+    def _prune_schema_cache(self):
+        """Delete all but the most recently used cached schema results"""
+        entries = []
+        for cache_file in self.schema_cache_dir.glob("*.json"):
+            try:
+                entries.append((cache_file.stat().st_mtime_ns, cache_file))
+            except FileNotFoundError:
+                continue  # Removed by a concurrent run
+        entries.sort(reverse=True)
+        for _, stale_file in entries[_SCHEMA_CACHE_MAX_ENTRIES:]:
+            stale_file.unlink(missing_ok=True)
+    
+    def _discover_schema_dict(self, data_files: List[str]) -> Dict[str, Any]:
+        """Run the schema discovery agent and convert its output to a dictionary"""
         # Use schema discovery agent to analyze files
         schema_output = self.schema_agent.discover_schema(data_files)
         
         # Convert to dictionary format for easier handling
-        schema_dict = {
+        return {
             "timestamp": schema_output.timestamp,
             "data_sources": schema_output.data_sources,
             "total_fields": schema_output.total_fields,
@@ -137,23 +321,14 @@ class Condition4EnhancedGuidance:
             "business_context_available": schema_output.business_context_available,
             "confidence_score": schema_output.confidence_score
         }
-        
-        # Save schema discovery results
-        schema_file = self.results_dir / f"schema_discovery_{self.test_timestamp}.json"
-        with open(schema_file, 'w') as f:
-            json.dump(schema_dict, f, indent=2, default=str)
-        
-        logger.info(f"Schema discovery complete. Quality score: {schema_output.data_quality_score:.2f}")
-        return schema_dict
     
     def load_enhanced_guidance_prompt(self) -> str:
         """Load the enhanced guidance prompt template"""
         prompt_path = project_root / "prompts" / "enhanced_guidance" / "output_generation.md"
         
-        if prompt_path.exists():
-            with open(prompt_path, 'r') as f:
-                return f.read()
-        else:
+        try:
+            return read_prompt_template(prompt_path)
+        except FileNotFoundError:
             # Fallback enhanced guidance prompt
             return """
 You are a senior data analyst specializing in retail location performance analysis.
@@ -184,6 +359,135 @@ Focus on delivering executive-level insights that enable immediate business deci
         """
         logger.info("Running enhanced guidance analysis")
         
+        # One timestamp stamps the prompt transcript and the result
+        timestamp = datetime.now().isoformat()
+        data_df, context = self._prepare_analysis_context(data_files, schema_metadata)
+        full_prompt = self._build_analysis_prompt(question, context)
+        
+        if dry_run:
+            # No requests in dry run mode, so tokens are estimated locally
+            return self._save_dry_run_prompt(full_prompt, _estimate_tokens(full_prompt))
+        
+        estimated_tokens = self._count_input_tokens(full_prompt)
+        
+        # The transcript is written on a background thread so the request goes out immediately
+        prompt_writer = None
+        if self.save_prompt:
+            prompt_writer = threading.Thread(
+                target=self._save_final_prompt,
+                args=(full_prompt, estimated_tokens, self.test_timestamp, timestamp)
+            )
+            prompt_writer.start()
+        
+        # Call Claude API with enhanced guidance
+        try:
+            response = self.api_client.messages.create(
+                messages=[{"role": "user", "content": full_prompt}],
+                **self._message_params()
+            )
+            result = self._build_analysis_result(question, data_files, data_df, schema_metadata, response,
+                                                 timestamp)
+            
+            logger.info(f"Enhanced guidance analysis complete. Tokens used: {result['token_usage']['total']}")
+            return result
+            
+        except Exception as e:
+            return self._build_analysis_error(e, question, data_files, data_df, timestamp)
+        
+        finally:
+            if prompt_writer is not None:
+                prompt_writer.join()
+    
+    def run_complete_test_batch(self, questions: List[str], max_concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Run the Condition 4 test for several questions with concurrent API calls
+        
+        Schema discovery, data loading and context reduction are shared by all
+        questions; only the question line of the prompt differs. Requests go out
+        through AsyncAnthropic, so wall time is close to the slowest request
+        rather than the sum of all of them.
+        
+        Args:
+            questions: Business questions to analyze
+            max_concurrency: Maximum number of requests in flight at once
+            
+        Returns:
+            One run_complete_test-style result per question, in input order
+        """
+        logger.info(f"Starting Condition 4 batch: {len(questions)} questions")
+        
+        try:
+            data_files = self.discover_curated_data()
+            schema_metadata = self.run_schema_discovery_with_enrichment(data_files)
+            data_df, context = self._prepare_analysis_context(data_files, schema_metadata)
+        except Exception as e:
+            logger.error(f"Condition 4 batch failed: {e}")
+            return [{"success": False, "error": str(e)} for _ in questions]
+        
+        analysis_results = asyncio.run(
+            self._run_analyses_async(questions, data_files, schema_metadata, data_df, context, max_concurrency)
+        )
+        
+        results = []
+        for i, analysis_result in enumerate(analysis_results, 1):
+            comparison = self.compare_with_condition_3(analysis_result)
+            results_file = self.save_results(schema_metadata, analysis_result, comparison,
+                                             f"{self.test_timestamp}_{i}")
+            results.append({
+                "success": True,
+                "results_file": str(results_file),
+                "schema_metadata": schema_metadata,
+                "analysis_result": analysis_result,
+                "comparison": comparison
+            })
+        
+        logger.info("Condition 4 batch complete!")
+        return results
+    
+    async def _run_analyses_async(self, questions: List[str], data_files: List[str],
+                                  schema_metadata: Dict[str, Any], data_df: pd.DataFrame,
+                                  context: Dict[str, Any], max_concurrency: int) -> List[Dict[str, Any]]:
+        """Analyze every question against one shared context with bounded concurrency"""
+        import anthropic
+        
+        submitted_at = datetime.now().isoformat()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        client = anthropic.AsyncAnthropic(api_key=self.api_client.api_key)
+        
+        async def analyze(i: int, question: str) -> Dict[str, Any]:
+            try:
+                full_prompt = self._build_analysis_prompt(question, context)
+                async with semaphore:
+                    estimated_tokens = await self._count_input_tokens_async(client, full_prompt)
+                if self.save_prompt:
+                    # Off the event loop, so the file write does not stall other requests
+                    await asyncio.to_thread(self._save_final_prompt, full_prompt, estimated_tokens,
+                                            f"{self.test_timestamp}_{i}", submitted_at)
+                async with semaphore:
+                    response = await client.messages.create(
+                        messages=[{"role": "user", "content": full_prompt}],
+                        **self._message_params()
+                    )
+                return self._build_analysis_result(question, data_files, data_df, schema_metadata, response,
+                                                   submitted_at)
+            except Exception as e:
+                return self._build_analysis_error(e, question, data_files, data_df, submitted_at)
+        
+        try:
+            return await asyncio.gather(*(analyze(i, question) for i, question in enumerate(questions, 1)))
+        finally:
+            await client.close()
+    
+    def _prepare_analysis_context(self, data_files: List[str],
+                                  schema_metadata: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Load the curated data and build the question-independent parts of the prompt
+        
+        Returns:
+            Tuple of (full dataframe, context with guidance prompt, schema summary and data table)
+        """
+        import pandas as pd
+        
         # Load the curated data (use first file for now)
         data_df = pd.read_csv(data_files[0])
         logger.info(f"Loaded curated data: {data_df.shape}")
@@ -194,50 +498,92 @@ Focus on delivering executive-level insights that enable immediate business deci
         # Intelligent data reduction to fit context limits
         reduced_data, schema_summary = self._reduce_data_for_context(data_df, schema_metadata)
         
-        # Build enhanced prompt with optimized context
-        full_prompt = f"""
-{enhanced_prompt}
+        return data_df, {
+            "enhanced_prompt": enhanced_prompt,
+            "schema_summary": schema_summary,
+            "location_count": len(reduced_data),
+            "data_table": self._render_data_table(reduced_data)
+        }
+    
+    def _render_data_table(self, data_df: pd.DataFrame) -> str:
+        """Render location data for the prompt in the configured format (aligned table by default)"""
+        if self.config.get("enhanced_guidance", {}).get("data_format", "table") == "csv":
+            return data_df.to_csv(index=False)
+        return data_df.to_string()
+    
+    def _build_analysis_prompt(self, question: str, context: Dict[str, Any]) -> str:
+        """Build the enhanced prompt for one question from the shared context"""
+        return f"""
+{context['enhanced_prompt']}
 
 BUSINESS QUESTION: {question}
 
 ENHANCED SCHEMA SUMMARY:
-{schema_summary}
+{context['schema_summary']}
 
-CURATED LOCATION DATA ({len(reduced_data)} locations):
-{reduced_data.to_string()}
+CURATED LOCATION DATA ({context['location_count']} locations):
+{context['data_table']}
 
 Please provide comprehensive business analysis with actionable recommendations using the enhanced guidance framework.
 """
+    
+    def _message_params(self) -> Dict[str, Any]:
+        """Model parameters for the analysis request"""
+        return {
+            "model": self.config["api"]["model"],
+            "max_tokens": self.config["api"]["max_tokens"],
+            "temperature": self.config["api"]["temperature"]
+        }
+    
+    def _count_input_tokens(self, full_prompt: str) -> float:
+        """Input tokens for a prompt from the token counting endpoint, or a local estimate if it is unavailable"""
+        try:
+            return self.api_client.messages.count_tokens(
+                model=self.config["api"]["model"],
+                messages=[{"role": "user", "content": full_prompt}]
+            ).input_tokens
+        except Exception:
+            return _estimate_tokens(full_prompt)
+    
+    async def _count_input_tokens_async(self, client, full_prompt: str) -> float:
+        """Async counterpart of _count_input_tokens for the batch client"""
+        try:
+            counted = await client.messages.count_tokens(
+                model=self.config["api"]["model"],
+                messages=[{"role": "user", "content": full_prompt}]
+            )
+            return counted.input_tokens
+        except Exception:
+            return _estimate_tokens(full_prompt)
+    
+    def _save_dry_run_prompt(self, full_prompt: str, estimated_tokens: float) -> Dict[str, Any]:
+        """Save the prompt for review without calling the API"""
+        logger.info("DRY RUN MODE - No API call will be made")
+        logger.info(f"Estimated input tokens: {estimated_tokens:.0f}")
+        logger.info(f"Prompt length: {len(full_prompt)} characters")
         
-        # Estimate token usage
-        estimated_tokens = len(full_prompt.split()) * 1.3  # Rough estimate
-        
-        if dry_run:
-            logger.info("DRY RUN MODE - No API call will be made")
-            logger.info(f"Estimated input tokens: {estimated_tokens:.0f}")
-            logger.info(f"Prompt length: {len(full_prompt)} characters")
-            
-            # Save dry run prompt for review
-            dry_run_file = self.results_dir / f"dry_run_prompt_{self.test_timestamp}.txt"
-            with open(dry_run_file, 'w') as f:
-                f.write("DRY RUN - PROMPT PREVIEW\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(full_prompt)
-            
-            return {
-                "dry_run": True,
-                "estimated_tokens": estimated_tokens,
-                "prompt_length": len(full_prompt),
-                "prompt_file": str(dry_run_file),
-                "message": "Dry run complete - no API call made"
-            }
+        # Save dry run prompt for review
+        dry_run_file = self.results_dir / f"dry_run_prompt_{self.test_timestamp}.txt"
+        with open(dry_run_file, 'w') as f:
+            f.write("DRY RUN - PROMPT PREVIEW\n")
+            f.write("=" * 50 + "\n\n")
+            f.write(full_prompt)
         
-        # Save final prompt for transparency (always, not just dry run)
-        final_prompt_file = self.results_dir / f"final_prompt_{self.test_timestamp}.txt"
+        return {
+            "dry_run": True,
+            "estimated_tokens": estimated_tokens,
+            "prompt_length": len(full_prompt),
+            "prompt_file": str(dry_run_file),
+            "message": "Dry run complete - no API call made"
+        }
+    
+    def _save_final_prompt(self, full_prompt: str, estimated_tokens: float, run_id: str, timestamp: str):
+        """Save final prompt for transparency (always, not just dry run)"""
+        final_prompt_file = self.results_dir / f"final_prompt_{run_id}.txt"
         with open(final_prompt_file, 'w', encoding='utf-8') as f:
             f.write("FINAL PROMPT SENT TO LLM\n")
             f.write("=" * 50 + "\n\n")
-            f.write(f"Timestamp: {datetime.now().isoformat()}\n")
+            f.write(f"Timestamp: {timestamp}\n")
             f.write(f"Model: {self.config['api']['model']}\n")
             f.write(f"Max Tokens: {self.config['api']['max_tokens']}\n")
             f.write(f"Temperature: {self.config['api']['temperature']}\n")
@@ -248,49 +594,42 @@ Please provide comprehensive business analysis with actionable recommendations u
         
         logger.info(f"Final prompt saved to {final_prompt_file}")
         logger.info(f"Prompt length: {len(full_prompt)} characters, estimated tokens: {estimated_tokens:.0f}")
-        
-        # Call Claude API with enhanced guidance
-        try:
-            response = self.api_client.messages.create(
-                model=self.config["api"]["model"],
-                max_tokens=self.config["api"]["max_tokens"],
-                temperature=self.config["api"]["temperature"],
-                messages=[{"role": "user", "content": full_prompt}]
-            )
-            
-            result = {
-                "timestamp": datetime.now().isoformat(),
-                "condition": "4_enhanced_guidance",
-                "question": question,
-                "data_files": data_files,
-                "data_shape": list(data_df.shape),
-                "schema_enrichment": {
-                    "total_fields": schema_metadata["total_fields"],
-                    "quality_score": schema_metadata["data_quality_score"],
-                    "confidence_score": schema_metadata["confidence_score"],
-                    "business_context_available": schema_metadata["business_context_available"]
-                },
-                "response": response.content[0].text,
-                "token_usage": {
-                    "input": response.usage.input_tokens,
-                    "output": response.usage.output_tokens,
-                    "total": response.usage.input_tokens + response.usage.output_tokens
-                }
-            }
-            
-            logger.info(f"Enhanced guidance analysis complete. Tokens used: {result['token_usage']['total']}")
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error in enhanced guidance analysis: {e}")
-            return {
-                "error": str(e),
-                "timestamp": datetime.now().isoformat(),
-                "condition": "4_enhanced_guidance",
-                "question": question,
-                "data_files": data_files if 'data_files' in locals() else [],
-                "data_shape": list(data_df.shape) if 'data_df' in locals() else [0, 0]
+    
+    def _build_analysis_result(self, question: str, data_files: List[str], data_df: pd.DataFrame,
+                               schema_metadata: Dict[str, Any], response, timestamp: str) -> Dict[str, Any]:
+        """Build the analysis result for a Claude response"""
+        return {
+            "timestamp": timestamp,
+            "condition": "4_enhanced_guidance",
+            "question": question,
+            "data_files": data_files,
+            "data_shape": list(data_df.shape),
+            "schema_enrichment": {
+                "total_fields": schema_metadata["total_fields"],
+                "quality_score": schema_metadata["data_quality_score"],
+                "confidence_score": schema_metadata["confidence_score"],
+                "business_context_available": schema_metadata["business_context_available"]
+            },
+            "response": response.content[0].text,
+            "token_usage": {
+                "input": response.usage.input_tokens,
+                "output": response.usage.output_tokens,
+                "total": response.usage.input_tokens + response.usage.output_tokens
             }
+        }
+    
+    def _build_analysis_error(self, error: Exception, question: str, data_files: List[str],
+                              data_df: pd.DataFrame, timestamp: str) -> Dict[str, Any]:
+        """Build the analysis result for a failed analysis"""
+        logger.error(f"Error in enhanced guidance analysis: {error}")
+        return {
+            "error": str(error),
+            "timestamp": timestamp,
+            "condition": "4_enhanced_guidance",
+            "question": question,
+            "data_files": data_files,
+            "data_shape": list(data_df.shape)
+        }
     
     def compare_with_condition_3(self, condition_4_result: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -378,9 +717,9 @@ Please provide comprehensive business analysis with actionable recommendations u
         Returns:
             Tuple of (reduced_dataframe, schema_summary)
         """
-        # Estimate current sizes
-        full_data_size = len(data_df.to_string())
-        full_schema_size = len(json.dumps(schema_metadata, indent=2, default=str))
+        # Estimate current sizes (the table itself is only rendered once, for the prompt)
+        full_data_size = _estimate_table_chars(data_df)
+        full_schema_size = len(dump_json(schema_metadata))
         
         logger.info(f"Original data size: {full_data_size:,} chars, Schema size: {full_schema_size:,} chars")
         
@@ -393,20 +732,30 @@ Please provide comprehensive business analysis with actionable recommendations u
         # Step 1: Create condensed schema summary
         schema_summary = self._create_schema_summary(schema_metadata, max_schema_chars)
         
-        # Step 2: Reduce location data if needed
-        if full_data_size > max_data_chars:
+        # Step 2: Reduce location data if needed. An estimate just over the limit
+        # may be the estimator's overshoot, so the table is rendered to decide
+        exact_data_size = None
+        if max_data_chars < full_data_size <= max_data_chars * (1 + _TABLE_ESTIMATE_MARGIN):
+            exact_data_size = len(data_df.to_string())
+            logger.info(f"Exact data size near the limit: {exact_data_size:,} chars")
+        
+        if (exact_data_size if exact_data_size is not None else full_data_size) > max_data_chars:
             reduced_data = self._reduce_location_data(data_df, max_data_chars)
             logger.info(f"Reduced locations from {len(data_df)} to {len(reduced_data)} rows")
+            exact_data_size = None
         else:
             reduced_data = data_df
             logger.info(f"Using all {len(data_df)} locations (within size limits)")
         
-        # Final size check
-        final_data_size = len(reduced_data.to_string())
+        # Final size check; the data size is the estimate unless it was rendered above
         final_schema_size = len(schema_summary)
-        total_size = final_data_size + final_schema_size
-        
-        logger.info(f"Final sizes - Data: {final_data_size:,}, Schema: {final_schema_size:,}, Total: {total_size:,} chars")
+        if exact_data_size is not None:
+            logger.info(f"Final sizes - Data: {exact_data_size:,}, Schema: {final_schema_size:,}, "
+                        f"Total: {exact_data_size + final_schema_size:,} chars")
+        else:
+            final_data_size = _estimate_table_chars(reduced_data)
+            logger.info(f"Estimated final sizes - Data: ~{final_data_size:,}, Schema: {final_schema_size:,}, "
+                        f"Total: ~{final_data_size + final_schema_size:,} chars")
         
         return reduced_data, schema_summary
     
@@ -414,51 +763,65 @@ Please provide comprehensive business analysis with actionable recommendations u
         """
         Create a condensed schema summary focusing on key business context
         """
-        field_metadata = schema_metadata.get("field_metadata", {})
-        
         # Prioritize fields by importance tier
-        critical_fields = []
-        important_fields = []
-        supplementary_fields = []
-        
-        for field_name, field_info in field_metadata.items():
-            tier = field_info.get("importance_tier", 3)
-            field_summary = {
-                "name": field_name,
-                "purpose": field_info.get("business_purpose", ""),
-                "type": field_info.get("data_type", ""),
-                "completeness": field_info.get("completeness", 0)
-            }
-            
-            if tier == 1:
-                critical_fields.append(field_summary)
-            elif tier == 2:
-                important_fields.append(field_summary)
-            else:
-                supplementary_fields.append(field_summary)
+        critical_fields, important_fields, supplementary_fields = self._tier_buckets(
+            schema_metadata.get("field_metadata", {})
+        )
         
-        # Build condensed summary
-        summary = f"""SCHEMA DISCOVERY SUMMARY:
+        # Build condensed summary as parts, tracking the running length
+        parts = [f"""SCHEMA DISCOVERY SUMMARY:
 Total Fields: {schema_metadata.get('total_fields', 0)}
 Data Quality: {schema_metadata.get('data_quality_score', 0):.2f}
 Confidence: {schema_metadata.get('confidence_score', 0):.2f}
 
-CRITICAL FIELDS ({len(critical_fields)}):"""
+CRITICAL FIELDS ({len(critical_fields)}):"""]
+        length = len(parts[0])
         
         for field in critical_fields:
-            summary += f"\n• {field['name']}: {field['purpose']} ({field['type']}, {field['completeness']:.1%} complete)"
+            parts.append(f"\n• {field.name}: {field.purpose} ({field.type}, {field.completeness:.1%} complete)")
+            length += len(parts[-1])
+            if length > max_chars:
+                break  # Truncated below; later lines would be cut anyway
         
-        if important_fields and len(summary) < max_chars * 0.7:
-            summary += f"\n\nIMPORTANT FIELDS ({len(important_fields)}):"
-            for field in important_fields[:5]:  # Limit to top 5
-                summary += f"\n• {field['name']}: {field['purpose']}"
+        if important_fields and length < max_chars * 0.7:
+            important_parts = [f"\n\nIMPORTANT FIELDS ({len(important_fields)}):"]
+            important_parts.extend(f"\n• {field.name}: {field.purpose}"
+                                   for field in important_fields[:5])  # Limit to top 5
+            parts.extend(important_parts)
+            length += sum(map(len, important_parts))
+        
+        summary = "".join(parts)
         
         # Truncate if still too long
-        if len(summary) > max_chars:
+        if length > max_chars:
             summary = summary[:max_chars-50] + "\n... [Schema summary truncated for context efficiency]"
         
         return summary
     
+    def _tier_buckets(self, field_metadata: Dict[str, Any]) -> Tuple[List[FieldSummary], ...]:
+        """
+        Field summaries split into (critical, important, supplementary) by importance tier
+        
+        The buckets are kept for the most recent field_metadata object, so
+        rebuilding summaries from the same schema skips the pass over all fields.
+        """
+        if self._tier_cache is not None and self._tier_cache[0] is field_metadata:
+            return self._tier_cache[1]
+        
+        buckets = ([], [], [])
+        for field_name, field_info in field_metadata.items():
+            tier = field_info.get("importance_tier", 3)
+            buckets[tier - 1 if tier in (1, 2) else 2].append(FieldSummary(
+                name=field_name,
+                purpose=field_info.get("business_purpose", ""),
+                type=field_info.get("data_type", ""),
+                completeness=field_info.get("completeness", 0)
+            ))
+        
+        # Holding field_metadata keeps its identity from being reused by another object
+        self._tier_cache = (field_metadata, buckets)
+        return buckets
+    
     def _reduce_location_data(self, data_df: pd.DataFrame, max_chars: int) -> pd.DataFrame:
         """
         Intelligently reduce location data while maintaining representativeness
@@ -466,57 +829,65 @@ CRITICAL FIELDS ({len(critical_fields)}):"""
         # Strategy: Select diverse, high-priority locations
         
         # Step 1: Try to use priority score for selection
-        if "priority_score" in data_df.columns:
+        row_selection = self.config.get("enhanced_guidance", {}).get("row_selection", "priority")
+        if "priority_score" in data_df.columns and row_selection == "stratified":
+            reduced_df = self._stratified_location_sample(data_df, max_chars)
+            
+        elif "priority_score" in data_df.columns:
             # Sort by priority and take top performers + some lower performers for diversity
             sorted_df = data_df.sort_values("priority_score", ascending=False)
             
-            # Start with top priority locations
-            selected_rows = []
-            current_size = 0
-            
-            # Add high priority locations first
+            # Add high priority locations first, leaving some buffer
             high_priority = sorted_df.head(20)
-            for idx, row in high_priority.iterrows():
-                row_size = len(str(row.to_dict()))
-                if current_size + row_size < max_chars * 0.8:  # Leave some buffer
-                    selected_rows.append(idx)
-                    current_size += row_size
-                else:
-                    break
+            high_sizes = _row_dict_sizes(high_priority)
+            fitting = _count_fitting(high_sizes, 0, max_chars * 0.8)
+            selected_rows = list(high_priority.index[:fitting])
+            current_size = int(high_sizes[:fitting].sum())
             
             # Add some lower priority for diversity if space allows
             low_priority = sorted_df.tail(10)
-            for idx, row in low_priority.iterrows():
-                if idx not in selected_rows:
-                    row_size = len(str(row.to_dict()))
-                    if current_size + row_size < max_chars:
-                        selected_rows.append(idx)
-                        current_size += row_size
-                    else:
-                        break
+            low_priority = low_priority[~low_priority.index.isin(selected_rows)]
+            fitting = _count_fitting(_row_dict_sizes(low_priority), current_size, max_chars)
+            selected_rows.extend(low_priority.index[:fitting])
             
             reduced_df = data_df.loc[selected_rows]
             
         else:
-            # Fallback: Take first N rows that fit
-            selected_rows = []
-            current_size = 0
-            
-            for idx, row in data_df.iterrows():
-                row_size = len(str(row.to_dict()))
-                if current_size + row_size < max_chars:
-                    selected_rows.append(idx)
-                    current_size += row_size
-                else:
-                    break
-            
-            reduced_df = data_df.loc[selected_rows]
+            # Fallback: Take first N rows that fit; no more rows than could
+            # possibly fit need to be sized
+            candidates = data_df.head(max_chars // _min_row_dict_size(data_df) + 1)
+            fitting = _count_fitting(_row_dict_sizes(candidates), 0, max_chars)
+            reduced_df = data_df.loc[list(candidates.index[:fitting])]
         
         return reduced_df
     
+    def _stratified_location_sample(self, data_df: pd.DataFrame, max_chars: int,
+                                    num_buckets: int = 5) -> pd.DataFrame:
+        """
+        Select locations evenly across priority quantiles until the size budget is used
+        
+        Rows are shuffled with a fixed seed and taken round-robin from the
+        priority buckets, so trimming to the budget removes rows from every
+        tier alike. The selection is deterministic for a given dataset.
+        """
+        import numpy as np
+        import pandas as pd
+        
+        priority = pd.to_numeric(data_df["priority_score"], errors="coerce")
+        buckets = pd.qcut(priority, q=num_buckets, labels=False, duplicates="drop")
+        buckets = buckets.fillna(-1).to_numpy()  # Rows without a score form their own bucket
+        
+        order = np.random.default_rng(0).permutation(len(data_df))
+        rank_in_bucket = pd.Series(buckets[order]).groupby(buckets[order]).cumcount().to_numpy()
+        candidates = data_df.iloc[order[np.argsort(rank_in_bucket, kind="stable")]]
+        
+        fitting = _count_fitting(_row_dict_sizes(candidates), 0, max_chars)
+        return candidates.iloc[:fitting].sort_values("priority_score", ascending=False)
+    
     def save_results(self, schema_metadata: Dict[str, Any], analysis_result: Dict[str, Any], 
-                    comparison: Dict[str, Any]):
-        """Save all Condition 4 results"""
+                    comparison: Dict[str, Any], run_id: str = None):
+        """Save all Condition 4 results (run_id defaults to the test timestamp)"""
+        run_id = run_id or self.test_timestamp
         
         # Complete results package
         complete_results = {
@@ -529,13 +900,12 @@ CRITICAL FIELDS ({len(critical_fields)}):"""
         }
         
         # Save complete results
-        results_file = self.results_dir / f"condition_4_result_{self.test_timestamp}.json"
-        with open(results_file, 'w') as f:
-            json.dump(complete_results, f, indent=2, default=str)
+        results_file = self.results_dir / f"condition_4_result_{run_id}.json"
+        write_json(results_file, complete_results)
         
         # Save human-readable response
         if "response" in analysis_result:
-            response_file = self.results_dir / f"condition_4_response_{self.test_timestamp}.txt"
+            response_file = self.results_dir / f"condition_4_response_{run_id}.txt"
             with open(response_file, 'w') as f:
                 f.write(f"Question: {analysis_result.get('question', 'Unknown')}\n")
                 f.write(f"Timestamp: {analysis_result.get('timestamp', 'Unknown')}\n")
@@ -606,11 +976,31 @@ def main():
                        help="Business question to analyze")
     parser.add_argument("--dry-run", action="store_true",
                        help="Preview prompt and estimate tokens without making API call")
+    parser.add_argument("--no-save-prompt", action="store_true",
+                       help="Skip writing the final prompt transcript for the API call")
+    parser.add_argument("--questions-file",
+                       help="Analyze several questions, one per line, with concurrent API calls")
+    parser.add_argument("--max-concurrency", type=int, default=8,
+                       help="Maximum requests in flight with --questions-file")
     
     args = parser.parse_args()
     
     # Run Condition 4 test
-    test = Condition4EnhancedGuidance()
+    test = Condition4EnhancedGuidance(save_prompt=not args.no_save_prompt)
+    
+    if args.questions_file:
+        with open(args.questions_file, 'r') as f:
+            questions = [line.strip() for line in f if line.strip()]
+        batch_results = test.run_complete_test_batch(questions, args.max_concurrency)
+        for question, result in zip(questions, batch_results):
+            analysis = result.get("analysis_result", {})
+            if not result["success"] or "error" in analysis:
+                status = f"failed: {result.get('error') or analysis.get('error')}"
+            else:
+                status = f"{analysis['token_usage']['total']} tokens, saved to {result['results_file']}"
+            print(f"  {question[:60]}: {status}")
+        return
+    
     results = test.run_complete_test(args.question, args.dry_run)
     
     # Print summary
@@ -14,10 +14,11 @@ Key Features:
 
 import os
 import sys
-import yaml
-import json
+import re
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
@@ -25,10 +26,100 @@ from typing import Dict, List, Any, Optional
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
+from agents.file_io import read_json
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Common retail analytics field patterns as (name keywords, suggested business purpose),
+# checked in order against the lowercased field name
+_BUSINESS_PURPOSE_RULES = (
+    (("sales", "revenue"), "Sales performance and revenue tracking"),
+    (("location", "store"), "Location identification and geographic analysis"),
+    (("priority", "score"), "Business priority and performance scoring"),
+    (("date", "time"), "Temporal analysis and trend tracking"),
+    (("category", "product"), "Product categorization and inventory analysis"),
+    (("customer", "cust"), "Customer behavior and demographic analysis"),
+    (("trend", "change"), "Performance trend and change analysis")
+)
+# Each rule's keywords compiled into one alternation, so a field name is scanned once per rule
+_BUSINESS_PURPOSE_PATTERNS = tuple(
+    (re.compile("|".join(map(re.escape, keywords))), purpose)
+    for keywords, purpose in _BUSINESS_PURPOSE_RULES
+)
+
+# Name keywords for critical (tier 1) and important (tier 2) fields
+_TIER1_PATTERN = re.compile(r"sales|revenue|location|priority")
+_TIER2_PATTERN = re.compile(r"date|category|score")
+
+# Below this many bytes of learning files, parsing serially beats starting worker
+# processes and pickling the parsed insights back (KB-sized files take well
+# under a millisecond each; a pool costs several milliseconds to start)
+_PARALLEL_LOAD_MIN_BYTES = 64 * 1024 * 1024
+
+
+def _total_size(paths: List[str]) -> int:
+    """Combined size in bytes of the files that exist among paths"""
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass  # Reported when the file is loaded
+    return total
+
+
+@lru_cache(maxsize=8192)
+def _business_purpose_for(field_name: str) -> str:
+    """Suggested business purpose for a field name, memoized across sessions"""
+    field_lower = field_name.lower()
+    
+    # First matching rule wins, in table order
+    return next(
+        (purpose for pattern, purpose in _BUSINESS_PURPOSE_PATTERNS if pattern.search(field_lower)),
+        f"Analysis field for {field_name} - requires business context definition"
+    )
+
+
+@lru_cache(maxsize=8192)
+def _importance_tier_for(field_name: str, mostly_complete: bool) -> int:
+    """Suggested importance tier for a field name and whether it is over 80% complete"""
+    field_lower = field_name.lower()
+    
+    # Critical fields (tier 1)
+    if _TIER1_PATTERN.search(field_lower):
+        return 1
+    
+    # Important fields (tier 2) 
+    elif mostly_complete and _TIER2_PATTERN.search(field_lower):
+        return 2
+    
+    # Supplementary fields (tier 3)
+    else:
+        return 3
+
+
+def _next_version(version: Any) -> str:
+    """Bump the minor part of a "major.minor" config version ("1.9" -> "1.10")"""
+    major, _, minor = str(version).partition(".")
+    return f"{int(major)}.{int(minor or 0) + 1}"
+
+
+def _name_summary(names, limit: int = 20) -> str:
+    """Comma-separated names for a log line, truncated after the first few"""
+    names = list(names)
+    summary = ", ".join(names[:limit])
+    return summary + f", ... (+{len(names) - limit} more)" if len(names) > limit else summary
+
+
+def _load_learning_file(file_path: str) -> Dict[str, Any]:
+    """Insights section of one learning file, or the error that prevented loading it"""
+    try:
+        return {"insights": read_json(file_path).get("insights", {})}
+    except Exception as e:
+        return {"error": str(e)}
+
 
 class ConfigLearningManager:
     """
@@ -39,8 +130,7 @@ class ConfigLearningManager:
         """Initialize the config learning manager"""
         self.project_root = project_root
         self.config_file = project_root / "llm_columns_canonical.yaml"
-        self.learning_dir = project_root / "config" / "learning"
-        self.learning_dir.mkdir(parents=True, exist_ok=True)
+        self.learning_dir = project_root / "config" / "learning"  # Created when files are archived
         
     def discover_learning_files(self) -> List[str]:
         """Discover all learning insight files"""
@@ -55,49 +145,59 @@ class ConfigLearningManager:
     
     def load_learning_insights(self, learning_files: List[str]) -> Dict[str, Any]:
         """Load and consolidate learning insights from multiple files"""
-        consolidated_insights = {
-            "new_fields": [],
-            "updated_statistics": [],
-            "potential_relationships": [],
-            "data_quality_insights": []
-        }
+        # New fields are keyed by name while consolidating; the first occurrence wins
+        new_fields = {}
+        updated_statistics = []
+        potential_relationships = []
+        data_quality_insights = []
+        list_targets = (
+            ("updated_statistics", updated_statistics),
+            ("potential_relationships", potential_relationships),
+            ("data_quality_insights", data_quality_insights)
+        )
+        
+        # Files are parsed independently, in worker processes when there is a lot to parse
+        if (os.cpu_count() or 1) > 1 and _total_size(learning_files) >= _PARALLEL_LOAD_MIN_BYTES:
+            with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+                loaded_files = list(executor.map(_load_learning_file, learning_files, chunksize=4))
+        else:
+            loaded_files = map(_load_learning_file, learning_files)
         
-        for file_path in learning_files:
+        for file_path, loaded in zip(learning_files, loaded_files):
+            if "error" in loaded:
+                logger.warning(f"Could not load {file_path}: {loaded['error']}")
+                continue
+            
             try:
-                with open(file_path, 'r') as f:
-                    learning_data = json.load(f)
-                
-                insights = learning_data.get("insights", {})
+                insights = loaded["insights"]
                 
                 # Consolidate insights
-                for key in consolidated_insights.keys():
-                    if key in insights:
-                        consolidated_insights[key].extend(insights[key])
+                for field in insights.get("new_fields", ()):
+                    new_fields.setdefault(field["field_name"], field)
+                for key, consolidated in list_targets:
+                    consolidated.extend(insights.get(key, ()))
                 
                 logger.info(f"Loaded insights from {file_path}")
                 
             except Exception as e:
                 logger.warning(f"Could not load {file_path}: {e}")
         
-        # Remove duplicates from new fields
-        seen_fields = set()
-        unique_new_fields = []
-        for field in consolidated_insights["new_fields"]:
-            field_name = field["field_name"]
-            if field_name not in seen_fields:
-                unique_new_fields.append(field)
-                seen_fields.add(field_name)
-        
-        consolidated_insights["new_fields"] = unique_new_fields
-        
-        return consolidated_insights
+        return {
+            "new_fields": list(new_fields.values()),
+            "updated_statistics": updated_statistics,
+            "potential_relationships": potential_relationships,
+            "data_quality_insights": data_quality_insights
+        }
     
     def load_current_config(self) -> Dict[str, Any]:
         """Load current canonical configuration"""
         if self.config_file.exists():
             try:
-                with open(self.config_file, 'r') as f:
-                    return yaml.safe_load(f)
+                import yaml
+                
+                # libyaml's C loader when PyYAML was built with it; it decodes the UTF-8 bytes itself
+                loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+                return yaml.load(self.config_file.read_bytes(), Loader=loader)
             except Exception as e:
                 logger.warning(f"Could not load current config: {e}")
         
@@ -109,8 +209,9 @@ class ConfigLearningManager:
         }
     
     def generate_config_updates(self, insights: Dict[str, Any], 
-                              current_config: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate configuration updates based on learning insights"""
+                              current_config: Dict[str, Any], timestamp: Optional[str] = None) -> Dict[str, Any]:
+        """Generate configuration updates based on learning insights (timestamp defaults to now)"""
+        timestamp = timestamp or datetime.now().isoformat()
         updates = {
             "new_field_definitions": {},
             "updated_field_statistics": {},
@@ -137,7 +238,7 @@ class ConfigLearningManager:
                     "sample_values": new_field["sample_values"],
                     "business_rules": [],
                     "relationships": [],
-                    "discovered_date": datetime.now().isoformat()
+                    "discovered_date": timestamp
                 }
         
         # Process updated statistics
@@ -153,80 +254,57 @@ class ConfigLearningManager:
     
     def _suggest_business_purpose(self, field_name: str, field_data: Dict[str, Any]) -> str:
         """Suggest business purpose based on field name patterns"""
-        field_lower = field_name.lower()
-        
-        # Common retail analytics field patterns
-        if "sales" in field_lower or "revenue" in field_lower:
-            return "Sales performance and revenue tracking"
-        elif "location" in field_lower or "store" in field_lower:
-            return "Location identification and geographic analysis"
-        elif "priority" in field_lower or "score" in field_lower:
-            return "Business priority and performance scoring"
-        elif "date" in field_lower or "time" in field_lower:
-            return "Temporal analysis and trend tracking"
-        elif "category" in field_lower or "product" in field_lower:
-            return "Product categorization and inventory analysis"
-        elif "customer" in field_lower or "cust" in field_lower:
-            return "Customer behavior and demographic analysis"
-        elif "trend" in field_lower or "change" in field_lower:
-            return "Performance trend and change analysis"
-        else:
-            return f"Analysis field for {field_name} - requires business context definition"
+        return _business_purpose_for(field_name)
     
     def _suggest_importance_tier(self, field_name: str, field_data: Dict[str, Any]) -> int:
         """Suggest importance tier based on field characteristics"""
-        field_lower = field_name.lower()
-        completeness = field_data.get("completeness", 0)
-        unique_ratio = field_data.get("unique_values", 0) / max(1, len(field_data.get("sample_values", [])))
-        
-        # Critical fields (tier 1)
-        if any(keyword in field_lower for keyword in ["sales", "revenue", "location", "priority"]):
-            return 1
-        
-        # Important fields (tier 2) 
-        elif completeness > 0.8 and any(keyword in field_lower for keyword in ["date", "category", "score"]):
-            return 2
-        
-        # Supplementary fields (tier 3)
-        else:
-            return 3
+        # Completeness only matters through the 80% threshold, which keeps the cache key small
+        return _importance_tier_for(field_name, field_data.get("completeness", 0) > 0.8)
     
     def preview_config_changes(self, updates: Dict[str, Any]) -> str:
         """Generate a human-readable preview of proposed config changes"""
-        preview = "CONFIGURATION UPDATE PREVIEW\n"
-        preview += "=" * 50 + "\n\n"
+        # Sections are collected as parts and joined once at the end
+        parts = ["CONFIGURATION UPDATE PREVIEW\n", "=" * 50 + "\n\n"]
+        append = parts.append
         
         # New fields
         new_fields = updates.get("new_field_definitions", {})
         if new_fields:
-            preview += f"NEW FIELDS TO ADD ({len(new_fields)}):\n"
+            append(f"NEW FIELDS TO ADD ({len(new_fields)}):\n")
             for field_name, field_def in new_fields.items():
-                preview += f"  • {field_name}\n"
-                preview += f"    Purpose: {field_def['business_purpose']}\n"
-                preview += f"    Tier: {field_def['importance_tier']}, Completeness: {field_def['completeness']:.1%}\n"
-                preview += f"    Type: {field_def['data_type']}, Unique Values: {field_def['unique_values']}\n\n"
+                append(f"  • {field_name}\n"
+                       f"    Purpose: {field_def['business_purpose']}\n"
+                       f"    Tier: {field_def['importance_tier']}, Completeness: {field_def['completeness']:.1%}\n"
+                       f"    Type: {field_def['data_type']}, Unique Values: {field_def['unique_values']}\n\n")
         
         # Updated statistics
         updated_stats = updates.get("updated_field_statistics", {})
         if updated_stats:
-            preview += f"FIELD STATISTICS UPDATES ({len(updated_stats)}):\n"
+            append(f"FIELD STATISTICS UPDATES ({len(updated_stats)}):\n")
             for field_name, stat_update in updated_stats.items():
-                change = stat_update["new_completeness"] - stat_update["old_completeness"]
-                direction = "↑" if change > 0 else "↓"
-                preview += f"  • {field_name}: {stat_update['old_completeness']:.1%} → {stat_update['new_completeness']:.1%} {direction}\n"
+                old_completeness = stat_update["old_completeness"]
+                new_completeness = stat_update["new_completeness"]
+                direction = "↑" if new_completeness - old_completeness > 0 else "↓"
+                append(f"  • {field_name}: {old_completeness:.1%} → {new_completeness:.1%} {direction}\n")
         
         # Data quality insights
         quality_insights = updates.get("data_quality_improvements", [])
         if quality_insights:
-            preview += f"\nDATA QUALITY INSIGHTS ({len(quality_insights)}):\n"
-            for insight in quality_insights:
-                preview += f"  • {insight}\n"
+            append(f"\nDATA QUALITY INSIGHTS ({len(quality_insights)}):\n")
+            parts.extend(f"  • {insight}\n" for insight in quality_insights)
         
-        return preview
+        return "".join(parts)
     
-    def apply_config_updates(self, updates: Dict[str, Any], current_config: Dict[str, Any]) -> Dict[str, Any]:
-        """Apply updates to configuration"""
-        updated_config = current_config.copy()
+    def apply_config_updates(self, updates: Dict[str, Any], current_config: Dict[str, Any],
+                             timestamp: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Apply updates to configuration (timestamp defaults to now)
+        
+        current_config is updated in place and returned; a shallow copy would
+        still share its "fields" mapping, so it never isolated the caller.
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        updated_config = current_config
         
         # Ensure fields section exists
         if "fields" not in updated_config:
@@ -236,54 +314,77 @@ class ConfigLearningManager:
         new_fields = updates.get("new_field_definitions", {})
         for field_name, field_def in new_fields.items():
             updated_config["fields"][field_name] = field_def
-            logger.info(f"Added new field definition: {field_name}")
+            logger.debug("Added new field definition: %s", field_name)
+        if new_fields:
+            logger.info(f"Added {len(new_fields)} new field definitions ({_name_summary(new_fields)})")
         
         # Update statistics for existing fields
         updated_stats = updates.get("updated_field_statistics", {})
+        updated_names = []
         for field_name, stat_update in updated_stats.items():
             if field_name in updated_config["fields"]:
                 updated_config["fields"][field_name]["completeness"] = stat_update["new_completeness"]
-                updated_config["fields"][field_name]["last_updated"] = datetime.now().isoformat()
-                logger.info(f"Updated statistics for field: {field_name}")
+                updated_config["fields"][field_name]["last_updated"] = timestamp
+                updated_names.append(field_name)
+                logger.debug("Updated statistics for field: %s", field_name)
+        if updated_names:
+            logger.info(f"Updated statistics for {len(updated_names)} fields ({_name_summary(updated_names)})")
         
         # Update metadata
-        updated_config["last_updated"] = datetime.now().isoformat()
-        updated_config["version"] = str(float(updated_config.get("version", "1.0")) + 0.1)
+        updated_config["last_updated"] = timestamp
+        updated_config["version"] = _next_version(updated_config.get("version", "1.0"))
         
         return updated_config
     
-    def save_updated_config(self, updated_config: Dict[str, Any]):
-        """Save updated configuration to file"""
+    def save_updated_config(self, updated_config: Dict[str, Any], saved_at: Optional[datetime] = None):
+        """Save updated configuration to file (saved_at names the backup and defaults to now)"""
+        saved_at = saved_at or datetime.now()
+        
         # Create backup of current config
         if self.config_file.exists():
-            backup_file = self.config_file.with_suffix(f".backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.yaml")
-            import shutil
-            shutil.copy2(self.config_file, backup_file)
+            backup_file = self.config_file.with_suffix(f".backup_{saved_at.strftime('%Y%m%d_%H%M%S')}.yaml")
+            # The current file is about to be replaced rather than rewritten, so a
+            # hard link preserves it without copying; copy where links are unsupported
+            try:
+                os.link(self.config_file, backup_file)
+            except OSError:
+                import shutil
+                shutil.copy2(self.config_file, backup_file)
             logger.info(f"Created backup: {backup_file}")
         
-        # Save updated config
-        with open(self.config_file, 'w') as f:
-            yaml.dump(updated_config, f, indent=2, default_flow_style=False)
+        # Save updated config to a temporary file and swap it in atomically
+        import yaml
+        dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+        tmp_file = self.config_file.with_suffix(".tmp")
+        tmp_file.write_bytes(yaml.dump(updated_config, Dumper=dumper, indent=2,
+                                       default_flow_style=False, encoding="utf-8"))
+        os.replace(tmp_file, self.config_file)
         
         logger.info(f"Updated configuration saved to {self.config_file}")
     
     def archive_processed_learning_files(self, learning_files: List[str]):
         """Archive processed learning files"""
         archive_dir = self.learning_dir / "processed"
-        archive_dir.mkdir(exist_ok=True)
+        archive_dir.mkdir(parents=True, exist_ok=True)
         
+        import shutil
         for file_path in learning_files:
             file_name = Path(file_path).name
             archive_path = archive_dir / file_name
             
-            import shutil
             shutil.move(file_path, archive_path)
-            logger.info(f"Archived {file_name} to processed directory")
+            logger.debug("Archived %s to processed directory", file_name)
+        
+        logger.info(f"Archived {len(learning_files)} learning files to processed directory")
     
     def run_config_update_cycle(self, auto_apply: bool = False) -> Dict[str, Any]:
         """Run complete configuration update cycle"""
         logger.info("Starting configuration update cycle")
         
+        # One clock reading stamps every field, the config metadata and the backup name
+        cycle_time = datetime.now()
+        timestamp = cycle_time.isoformat()
+        
         # Step 1: Discover learning files
         learning_files = self.discover_learning_files()
         if not learning_files:
@@ -297,7 +398,7 @@ class ConfigLearningManager:
         current_config = self.load_current_config()
         
         # Step 4: Generate updates
-        updates = self.generate_config_updates(insights, current_config)
+        updates = self.generate_config_updates(insights, current_config, timestamp)
         
         # Step 5: Preview changes
         preview = self.preview_config_changes(updates)
@@ -305,8 +406,8 @@ class ConfigLearningManager:
         
         # Step 6: Apply updates (with confirmation if not auto)
         if auto_apply or input("\nApply these configuration updates? (y/N): ").lower().startswith('y'):
-            updated_config = self.apply_config_updates(updates, current_config)
-            self.save_updated_config(updated_config)
+            updated_config = self.apply_config_updates(updates, current_config, timestamp)
+            self.save_updated_config(updated_config, cycle_time)
             self.archive_processed_learning_files(learning_files)
             
             result = {
@@ -15,23 +15,38 @@ Key Features:
 """
 
 import os
+import re
 import sys
-import yaml
+import copy
 import json
+import time
+import random
+import hashlib
 import pandas as pd
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Dict, List, Any, Optional, Tuple
+import anthropic
+
+# tabulate is optional; pandas needs it for DataFrame.to_markdown
+try:
+    import tabulate
+except ImportError:
+    tabulate = None
 
 # Add project root to path for imports
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from agents.schema_discovery import SchemaDiscoveryAgent
+from agents.schema_discovery import SchemaDiscoveryAgent, load_yaml_config
 from agents.question_analyzer import QuestionAnalyzerAgent
 from agents.data_filter import DataFilterAgent
 from agents.output_generator import OutputGeneratorAgent
+from agents.file_io import dump_json, read_prompt_template, write_json
 from config.claude_api_config import get_api_client
 
 # Configure logging
@@ -39,6 +54,102 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 
+# Stage result fields stage 4 needs; timestamps, token usage and echoed
+# upstream contexts are dropped from its prompt when minimal_stage_context is set
+_STAGE_CONTEXT_FIELDS = ("stage", "original_question", "original_row_count", "filtered_row_count",
+                         "filtering_method", "response")
+
+
+def _minify_for_context(stage_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Project a stage result onto the fields the output stage reads"""
+    return {k: stage_result[k] for k in _STAGE_CONTEXT_FIELDS if k in stage_result}
+
+
+def _request_hash(stage: str, params: Dict[str, Any]) -> str:
+    """SHA-256 of a stage name and its full messages.create parameters"""
+    return hashlib.sha256(json.dumps({"stage": stage, **params}, sort_keys=True).encode()).hexdigest()
+
+
+# The required_fields list from stage 2's machine-readable output
+_REQUIRED_FIELDS_PATTERN = re.compile(r'"required_fields"\s*:\s*(\[[^\]]*\])')
+
+
+def _required_fields(response_text: str) -> List[str]:
+    """Field names stage 2 listed as required, or [] when its response has none"""
+    match = _REQUIRED_FIELDS_PATTERN.search(response_text)
+    if not match:
+        return []
+    try:
+        fields = json.loads(match.group(1))
+    except ValueError:
+        return []
+    return [field for field in fields if isinstance(field, str)]
+
+
+def _project_columns(df: pd.DataFrame, fields: List[str]) -> pd.DataFrame:
+    """
+    Restrict df to the named fields, matched case-insensitively
+    
+    The first column is always kept so rows stay identifiable; with no
+    matching fields the frame is returned whole.
+    """
+    by_name = {column.lower(): column for column in df.columns}
+    wanted = [by_name[field.lower()] for field in fields if field.lower() in by_name]
+    if not wanted:
+        return df
+    return df[list(dict.fromkeys([df.columns[0], *wanted]))]
+
+
+def _render_table(df: pd.DataFrame) -> str:
+    """Compact text table for a prompt: markdown when tabulate is installed"""
+    if tabulate is not None:
+        # An empty floatfmt keeps every float as stored instead of tabulate's 6 significant digits
+        return df.to_markdown(index=False, floatfmt="")
+    return df.to_string(index=False)
+
+
+def _is_transient(error: anthropic.APIError) -> bool:
+    """Whether an API error is worth retrying: rate limits, overload and connection failures"""
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        if error.status_code in (408, 409, 429) or error.status_code >= 500:
+            return True
+        # Errors raised mid-stream arrive on a 200 response and are identified by type
+        body = error.body if isinstance(error.body, dict) else {}
+        return body.get("error", {}).get("type") in ("overloaded_error", "rate_limit_error", "api_error")
+    return False
+
+
+# Per-run values that upstream stage results carry into later prompts: the
+# result timestamps, token usage and the session-specific filtered data path
+_VOLATILE_CONTEXT_PATTERN = re.compile(
+    r'"(?:timestamp|filtered_data_file)":\s*"[^"]*",?|"token_usage":\s*\{[^{}]*\},?'
+)
+
+
+def _cache_key(stage: str, params: Dict[str, Any]) -> str:
+    """
+    Response cache key: the request hash with per-run context values removed
+    
+    Stage 2-4 prompts embed earlier stage results, whose timestamps and token
+    usage differ on every run; left in, they would make those stages miss on
+    an otherwise identical rerun. Values inside embedded model responses are
+    JSON-escaped, so the pattern does not touch them.
+    """
+    messages = [{**message, "content": _VOLATILE_CONTEXT_PATTERN.sub("", message["content"])}
+                for message in params.get("messages", [])]
+    return _request_hash(stage, {**params, "messages": messages})
+
+
+def _list_csvs(directory: Path) -> List[str]:
+    """Paths of the CSV files in directory"""
+    # scandir reuses the directory listing's file type, avoiding glob's pattern
+    # matching and Path objects
+    with os.scandir(directory) as entries:
+        return [entry.path for entry in entries if entry.name.endswith(".csv") and entry.is_file()]
+
+
 class MultiPromptAgent:
     """
     Complete multi-prompt agent pipeline for retail analytics
@@ -47,12 +158,27 @@ class MultiPromptAgent:
     final actionable business recommendations.
     """
     
-    def __init__(self, config_path: str = None):
-        """Initialize the multi-prompt agent pipeline"""
+    def __init__(self, config_path: str = None, cache_responses: bool = False,
+                 resume_session: Optional[str] = None):
+        """
+        Initialize the multi-prompt agent pipeline
+        
+        Args:
+            config_path: Path to agent configuration file
+            cache_responses: Reuse stored LLM responses for stage calls with identical parameters
+            resume_session: ID of an earlier session to continue; stages whose saved
+                results match their inputs are not rerun
+        """
         self.project_root = project_root
         self.config_path = config_path or str(project_root / "config" / "agent_config.yaml")
         self.config = self._load_config()
         
+        # Compact prompt JSON trims whitespace tokens but changes the prompt text, so it is opt-in
+        self.compact_prompt_json = self.config["pipeline"].get("compact_prompt_json", False)
+        self.minimal_stage_context = self.config["pipeline"].get("minimal_stage_context", False)
+        self.reference_schema_context = self.config["pipeline"].get("reference_schema_context", False)
+        self.project_output_columns = self.config["pipeline"].get("project_output_columns", False)
+        
         # Initialize stage agents
         self.schema_agent = SchemaDiscoveryAgent(self.config_path)
         self.question_agent = QuestionAnalyzerAgent(self.config_path)
@@ -72,20 +198,37 @@ class MultiPromptAgent:
         # Results storage
         self.results_dir = project_root / "results" / "multi_prompt"
         self.results_dir.mkdir(parents=True, exist_ok=True)
+        self.response_cache_dir = self.results_dir / ".cache" if cache_responses else None
         
         # Session tracking
-        self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.session_id = resume_session or datetime.now().strftime("%Y%m%d_%H%M%S")
         self.session_dir = self.results_dir / f"session_{self.session_id}"
+        if resume_session and not self.session_dir.exists():
+            logger.warning(f"No session {resume_session} to resume, starting it fresh")
         self.session_dir.mkdir(exist_ok=True)
         
+        # Curated frames keyed by (path, mtime_ns, size); stages 1 and 3 read the same file
+        self._curated_frames = {}
+        
+        # Stage 3's selection, handed to stage 4 without a CSV round trip
+        self._filtered_df = None
+        
+        # Serializes appends to a batch's results.jsonl
+        self._results_lock = threading.Lock()
+        
     def _load_config(self) -> Dict[str, Any]:
-        """Load pipeline configuration"""
-        try:
-            with open(self.config_path, 'r') as f:
-                return yaml.safe_load(f)
-        except FileNotFoundError:
+        """Load pipeline configuration (parsed once per file version and shared; read-only)"""
+        config = load_yaml_config(self.config_path)
+        if config is None:
             logger.warning(f"Config file not found: {self.config_path}. Using defaults.")
             return self._get_default_config()
+        return config
+    
+    def _prompt_json(self, obj: Any) -> str:
+        """Serialize a context object for embedding in a stage prompt"""
+        if not self.compact_prompt_json:
+            return json.dumps(obj, indent=2, default=str)
+        return dump_json(obj, indent=False).decode('utf-8')
     
     def _get_default_config(self) -> Dict[str, Any]:
         """Provide default pipeline configuration"""
@@ -124,18 +267,16 @@ class MultiPromptAgent:
         discovered_files = {}
         
         for data_type, path in self.data_paths.items():
-            if path.exists():
-                csv_files = list(path.glob("*.csv"))
-                discovered_files[data_type] = [str(f) for f in csv_files]
-                logger.info(f"Found {len(csv_files)} {data_type} files")
-            else:
+            try:
+                discovered_files[data_type] = _list_csvs(path)
+                logger.info(f"Found {len(discovered_files[data_type])} {data_type} files")
+            except (FileNotFoundError, NotADirectoryError):
                 discovered_files[data_type] = []
                 logger.info(f"No {data_type} directory found")
         
         # Save discovery results
         discovery_file = self.session_dir / "data_discovery.json"
-        with open(discovery_file, 'w') as f:
-            json.dump(discovered_files, f, indent=2)
+        write_json(discovery_file, discovered_files)
         
         return discovered_files
     
@@ -168,8 +309,7 @@ class MultiPromptAgent:
         prompt_path = self.project_root / "prompts" / "enhanced_guidance" / "schema_discovery.md"
         
         try:
-            with open(prompt_path, 'r') as f:
-                schema_prompt = f.read()
+            schema_prompt = read_prompt_template(prompt_path)
         except FileNotFoundError:
             logger.warning("Schema discovery prompt not found, using basic prompt")
             schema_prompt = "Analyze the data schema and provide field metadata."
@@ -182,7 +322,7 @@ class MultiPromptAgent:
         curated_files = data_files.get("curated", [])
         if curated_files:
             try:
-                sample_data = pd.read_csv(curated_files[0])
+                sample_data = self._read_curated(curated_files[0])
                 logger.info(f"Loaded sample data: {sample_data.shape}")
             except Exception as e:
                 logger.error(f"Error loading sample data: {e}")
@@ -198,13 +338,13 @@ Sample Records:
 {sample_data.head(3).to_string()}
 """
         
-        config_context = json.dumps(config_knowledge, indent=2) if config_knowledge else "No existing config available"
+        config_context = self._prompt_json(config_knowledge) if config_knowledge else "No existing config available"
         
         full_prompt = f"""
 {schema_prompt}
 
 Available Data Files:
-{json.dumps(data_files, indent=2)}
+{self._prompt_json(data_files)}
 
 Sample Data Analysis:
 {data_summary}
@@ -215,14 +355,23 @@ Existing Configuration Knowledge:
 Please provide comprehensive schema discovery output in the specified JSON format.
 """
         
+        params = {
+            "model": self.config["api"]["model"],
+            "max_tokens": self.config["pipeline"]["stages"]["schema_discovery"]["max_tokens"],
+            "temperature": self.config["api"]["temperature"],
+            "messages": [{"role": "user", "content": full_prompt}]
+        }
+        
+        # Reuse this stage's saved result when a resumed session already ran it with the same inputs
+        stage_file = self.session_dir / "stage_1_schema_discovery.json"
+        inputs_hash = _request_hash("schema_discovery", params)
+        checkpoint = self._resumable(stage_file, inputs_hash)
+        if checkpoint is not None:
+            return checkpoint
+        
         # Call LLM for schema discovery
         try:
-            response = self.api_client.messages.create(
-                model=self.config["api"]["model"],
-                max_tokens=self.config["pipeline"]["stages"]["schema_discovery"]["max_tokens"],
-                temperature=self.config["api"]["temperature"],
-                messages=[{"role": "user", "content": full_prompt}]
-            )
+            response = self._create_message("schema_discovery", **params)
             
             schema_result = {
                 "timestamp": datetime.now().isoformat(),
@@ -237,10 +386,8 @@ Please provide comprehensive schema discovery output in the specified JSON forma
                 "config_enrichment": config_knowledge
             }
             
-            # Save stage results
-            stage_file = self.session_dir / "stage_1_schema_discovery.json"
-            with open(stage_file, 'w') as f:
-                json.dump(schema_result, f, indent=2, default=str)
+            # Save stage results with the hash of the request that produced them
+            write_json(stage_file, {**schema_result, "inputs_hash": inputs_hash})
             
             logger.info("Stage 1 complete: Schema discovery")
             return schema_result
@@ -270,14 +417,13 @@ Please provide comprehensive schema discovery output in the specified JSON forma
         prompt_path = self.project_root / "prompts" / "enhanced_guidance" / "question_analysis.md"
         
         try:
-            with open(prompt_path, 'r') as f:
-                question_prompt = f.read()
+            question_prompt = read_prompt_template(prompt_path)
         except FileNotFoundError:
             logger.warning("Question analysis prompt not found, using basic prompt")
             question_prompt = "Analyze the question and determine the analytical approach."
         
         # Create question analysis prompt
-        schema_context = json.dumps(schema_result, indent=2, default=str)
+        schema_context = self._prompt_json(schema_result)
         
         full_prompt = f"""
 {question_prompt}
@@ -290,20 +436,37 @@ Schema Discovery Context:
 Please provide question analysis output in the specified JSON format.
 """
         
+        params = {
+            "model": self.config["api"]["model"],
+            "max_tokens": self.config["pipeline"]["stages"]["question_analysis"]["max_tokens"],
+            "temperature": self.config["api"]["temperature"],
+            "messages": [{"role": "user", "content": full_prompt}]
+        }
+        
+        # Reuse this stage's saved result when a resumed session already ran it with the same inputs
+        stage_file = self.session_dir / "stage_2_question_analysis.json"
+        inputs_hash = _request_hash("question_analysis", params)
+        checkpoint = self._resumable(stage_file, inputs_hash)
+        if checkpoint is not None:
+            return checkpoint
+        
         # Call LLM for question analysis
         try:
-            response = self.api_client.messages.create(
-                model=self.config["api"]["model"],
-                max_tokens=self.config["pipeline"]["stages"]["question_analysis"]["max_tokens"],
-                temperature=self.config["api"]["temperature"],
-                messages=[{"role": "user", "content": full_prompt}]
-            )
+            response = self._create_message("question_analysis", **params)
+            
+            # The schema result is either embedded or referenced by its stage 1 artifact;
+            # stage 3 resolves the reference for its prompt, and stage 4 already receives
+            # the schema result directly, so the reference avoids sending it twice there
+            if self.reference_schema_context:
+                schema_entry = {"schema_context_ref": "stage_1_schema_discovery.json"}
+            else:
+                schema_entry = {"schema_context": schema_result}
             
             question_result = {
                 "timestamp": datetime.now().isoformat(),
                 "stage": "question_analysis",
                 "original_question": question,
-                "schema_context": schema_result,
+                **schema_entry,
                 "response": response.content[0].text,
                 "token_usage": {
                     "input": response.usage.input_tokens,
@@ -312,10 +475,8 @@ Please provide question analysis output in the specified JSON format.
                 }
             }
             
-            # Save stage results
-            stage_file = self.session_dir / "stage_2_question_analysis.json"
-            with open(stage_file, 'w') as f:
-                json.dump(question_result, f, indent=2, default=str)
+            # Save stage results with the hash of the request that produced them
+            write_json(stage_file, {**question_result, "inputs_hash": inputs_hash})
             
             logger.info("Stage 2 complete: Question analysis")
             return question_result
@@ -325,18 +486,24 @@ Please provide question analysis output in the specified JSON format.
             return {"error": str(e)}
     
     def stage_3_data_filtering(self, data_files: Dict[str, List[str]], 
-                              question_result: Dict[str, Any]) -> Dict[str, Any]:
+                              question_result: Dict[str, Any],
+                              filter_data: Optional[Tuple[pd.DataFrame, pd.DataFrame]] = None,
+                              schema_result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Stage 3: Intelligent Data Filtering
         
         Args:
             data_files: Available data files
             question_result: Output from question analysis stage
+            filter_data: _load_filter_data result computed once for a batch; loaded here if omitted
+            schema_result: Schema discovery output, substituted for a schema_context_ref
+                in question_result; read from the session's stage 1 artifact if omitted
             
         Returns:
             Filtered data and selection metadata
         """
         logger.info("=== STAGE 3: DATA FILTERING ===")
+        self._filtered_df = None
         
         if not self.config["pipeline"]["stages"]["data_filtering"]["enabled"]:
             logger.info("Data filtering stage disabled")
@@ -350,8 +517,10 @@ Please provide question analysis output in the specified JSON format.
         
         try:
             # Load the primary data file
-            data_df = pd.read_csv(curated_files[0])
-            logger.info(f"Loaded data for filtering: {data_df.shape}")
+            if filter_data is not None:
+                data_df, filtered_df = filter_data
+            else:
+                data_df, filtered_df = self._load_filter_data(curated_files[0])
         except Exception as e:
             logger.error(f"Error loading data for filtering: {e}")
             return {"error": str(e)}
@@ -360,24 +529,13 @@ Please provide question analysis output in the specified JSON format.
         prompt_path = self.project_root / "prompts" / "enhanced_guidance" / "data_filtering.md"
         
         try:
-            with open(prompt_path, 'r') as f:
-                filter_prompt = f.read()
+            filter_prompt = read_prompt_template(prompt_path)
         except FileNotFoundError:
             logger.warning("Data filtering prompt not found, using basic prompt")
             filter_prompt = "Filter the data to select the most representative subset."
         
-        # Apply basic filtering logic (placeholder for now)
-        max_rows = self.config["data_filtering"]["max_rows"]
-        
-        # Simple filtering: take top rows by priority score if available
-        if "priority_score" in data_df.columns:
-            filtered_df = data_df.nlargest(max_rows, "priority_score")
-        else:
-            # Fallback: take first N rows
-            filtered_df = data_df.head(max_rows)
-        
         # Create filtering prompt for LLM guidance
-        question_context = json.dumps(question_result, indent=2, default=str)
+        question_context = self._prompt_json(self._resolve_schema_context(question_result, schema_result))
         
         full_prompt = f"""
 {filter_prompt}
@@ -394,14 +552,24 @@ Filtered Data Sample:
 Please provide data filtering analysis and rationale in the specified JSON format.
 """
         
+        params = {
+            "model": self.config["api"]["model"],
+            "max_tokens": self.config["pipeline"]["stages"]["data_filtering"]["max_tokens"],
+            "temperature": self.config["api"]["temperature"],
+            "messages": [{"role": "user", "content": full_prompt}]
+        }
+        
+        # Reuse this stage's saved result when a resumed session already ran it with the same inputs
+        stage_file = self.session_dir / "stage_3_data_filtering.json"
+        inputs_hash = _request_hash("data_filtering", params)
+        checkpoint = self._resumable(stage_file, inputs_hash)
+        if checkpoint is not None:
+            self._filtered_df = filtered_df.reset_index(drop=True)
+            return checkpoint
+        
         # Call LLM for filtering analysis
         try:
-            response = self.api_client.messages.create(
-                model=self.config["api"]["model"],
-                max_tokens=self.config["pipeline"]["stages"]["data_filtering"]["max_tokens"],
-                temperature=self.config["api"]["temperature"],
-                messages=[{"role": "user", "content": full_prompt}]
-            )
+            response = self._create_message("data_filtering", **params)
             
             filter_result = {
                 "timestamp": datetime.now().isoformat(),
@@ -418,13 +586,13 @@ Please provide data filtering analysis and rationale in the specified JSON forma
                 }
             }
             
-            # Save filtered data
+            # Save filtered data; stage 4 gets the same rows in memory, indexed as they
+            # would be when read back from the CSV
             filtered_df.to_csv(self.session_dir / "filtered_data.csv", index=False)
+            self._filtered_df = filtered_df.reset_index(drop=True)
             
-            # Save stage results
-            stage_file = self.session_dir / "stage_3_data_filtering.json"
-            with open(stage_file, 'w') as f:
-                json.dump(filter_result, f, indent=2, default=str)
+            # Save stage results with the hash of the request that produced them
+            write_json(stage_file, {**filter_result, "inputs_hash": inputs_hash})
             
             logger.info("Stage 3 complete: Data filtering")
             return filter_result
@@ -433,6 +601,64 @@ Please provide data filtering analysis and rationale in the specified JSON forma
             logger.error(f"Error in data filtering stage: {e}")
             return {"error": str(e)}
     
+    def _resolve_schema_context(self, question_result: Dict[str, Any],
+                                schema_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        question_result with a schema_context_ref replaced by the schema result it names
+        
+        The key is swapped in place, so the context matches what stage 2 would
+        have embedded without reference_schema_context.
+        """
+        ref = question_result.get("schema_context_ref")
+        if ref is None:
+            return question_result
+        
+        if schema_result is None:
+            try:
+                with open(self.session_dir / ref, 'rb') as f:
+                    schema_result = json.load(f)
+                schema_result.pop("inputs_hash", None)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not resolve schema context {ref}: {e}")
+                return question_result
+        
+        resolved = {}
+        for k, v in question_result.items():
+            if k == "schema_context_ref":
+                resolved["schema_context"] = schema_result
+            else:
+                resolved[k] = v
+        return resolved
+    
+    def _read_curated(self, path: str) -> pd.DataFrame:
+        """
+        Read a curated CSV once per file version and share the frame between stages
+        
+        Callers must not modify the frame.
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in self._curated_frames:
+            self._curated_frames[key] = pd.read_csv(path)
+        return self._curated_frames[key]
+    
+    def _load_filter_data(self, curated_file: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Load the primary data file and select the rows for stage 3 (independent of earlier stages)"""
+        data_df = self._read_curated(curated_file)
+        logger.info(f"Loaded data for filtering: {data_df.shape}")
+        
+        # Apply basic filtering logic (placeholder for now)
+        max_rows = self.config["data_filtering"]["max_rows"]
+        
+        # Simple filtering: take top rows by priority score if available
+        if "priority_score" in data_df.columns:
+            filtered_df = data_df.nlargest(max_rows, "priority_score")
+        else:
+            # Fallback: take first N rows
+            filtered_df = data_df.head(max_rows)
+        
+        return data_df, filtered_df
+    
     def stage_4_output_generation(self, question: str, schema_result: Dict[str, Any],
                                  question_result: Dict[str, Any], 
                                  filter_result: Dict[str, Any]) -> Dict[str, Any]:
@@ -454,10 +680,13 @@ Please provide data filtering analysis and rationale in the specified JSON forma
             logger.info("Output generation stage disabled")
             return {}
         
-        # Load filtered data
+        # Load filtered data (from disk only when stage 3 did not run in this pipeline)
         try:
             filtered_data_path = self.session_dir / "filtered_data.csv"
-            if filtered_data_path.exists():
+            if self._filtered_df is not None:
+                filtered_df = self._filtered_df
+                logger.info(f"Using filtered data from stage 3: {filtered_df.shape}")
+            elif filtered_data_path.exists():
                 filtered_df = pd.read_csv(filtered_data_path)
                 logger.info(f"Loaded filtered data: {filtered_df.shape}")
             else:
@@ -471,8 +700,7 @@ Please provide data filtering analysis and rationale in the specified JSON forma
         prompt_path = self.project_root / "prompts" / "enhanced_guidance" / "output_generation.md"
         
         try:
-            with open(prompt_path, 'r') as f:
-                output_prompt = f.read()
+            output_prompt = read_prompt_template(prompt_path)
         except FileNotFoundError:
             logger.warning("Output generation prompt not found, using basic prompt")
             output_prompt = "Generate actionable business insights and recommendations."
@@ -483,8 +711,16 @@ Please provide data filtering analysis and rationale in the specified JSON forma
             "question_analysis": question_result,
             "data_filtering": filter_result
         }
+        if self.minimal_stage_context:
+            pipeline_context = {name: _minify_for_context(result) for name, result in pipeline_context.items()}
+        
+        context_json = self._prompt_json(pipeline_context)
         
-        context_json = json.dumps(pipeline_context, indent=2, default=str)
+        if self.project_output_columns:
+            fields = _required_fields(question_result.get("response", ""))
+            data_table = _render_table(_project_columns(filtered_df, fields))
+        else:
+            data_table = filtered_df.to_string()
         
         full_prompt = f"""
 {output_prompt}
@@ -495,19 +731,30 @@ Pipeline Context:
 {context_json}
 
 Filtered Data for Analysis:
-{filtered_df.to_string()}
+{data_table}
 
 Please provide comprehensive business analysis with actionable recommendations using the specified format.
 """
         
+        params = {
+            "model": self.config["api"]["model"],
+            "max_tokens": self.config["pipeline"]["stages"]["output_generation"]["max_tokens"],
+            "temperature": 0.2,  # Slightly higher for more creative recommendations
+            "messages": [{"role": "user", "content": full_prompt}]
+        }
+        
+        # Reuse this stage's saved result when a resumed session already ran it with the same inputs
+        stage_file = self.session_dir / "stage_4_output_generation.json"
+        inputs_hash = _request_hash("output_generation", params)
+        checkpoint = self._resumable(stage_file, inputs_hash)
+        if checkpoint is not None:
+            return checkpoint
+        
         # Call LLM for final output generation
         try:
-            response = self.api_client.messages.create(
-                model=self.config["api"]["model"],
-                max_tokens=self.config["pipeline"]["stages"]["output_generation"]["max_tokens"],
-                temperature=0.2,  # Slightly higher for more creative recommendations
-                messages=[{"role": "user", "content": full_prompt}]
-            )
+            # The human-readable output is written as it is generated
+            output_file = self.session_dir / "final_output.txt"
+            response = self._create_message("output_generation", output_file=output_file, **params)
             
             output_result = {
                 "timestamp": datetime.now().isoformat(),
@@ -522,15 +769,8 @@ Please provide comprehensive business analysis with actionable recommendations u
                 }
             }
             
-            # Save stage results
-            stage_file = self.session_dir / "stage_4_output_generation.json"
-            with open(stage_file, 'w') as f:
-                json.dump(output_result, f, indent=2, default=str)
-            
-            # Save human-readable output
-            output_file = self.session_dir / "final_output.txt"
-            with open(output_file, 'w') as f:
-                f.write(response.content[0].text)
+            # Save stage results with the hash of the request that produced them
+            write_json(stage_file, {**output_result, "inputs_hash": inputs_hash})
             
             logger.info("Stage 4 complete: Output generation")
             return output_result
@@ -539,16 +779,120 @@ Please provide comprehensive business analysis with actionable recommendations u
             logger.error(f"Error in output generation stage: {e}")
             return {"error": str(e)}
     
+    def _create_message(self, stage: str, output_file: Optional[Path] = None, **params):
+        """
+        Call the messages API, answering from the response cache when it is enabled
+        
+        Entries are keyed by a SHA-256 of the stage name and the full request
+        parameters less per-run context values (see _cache_key), so any other
+        change to the prompt, model or sampling settings is a miss. Cached
+        responses carry the text and the token usage of the original call.
+        
+        With output_file the response is streamed and its text written to the
+        file as it is generated; the file is removed if the stream fails.
+        """
+        if self.response_cache_dir is None:
+            return self._send_message(output_file, params)
+        
+        key = _cache_key(stage, params)
+        cache_file = self.response_cache_dir / f"{key}.json"
+        if cache_file.exists():
+            with open(cache_file, 'r') as f:
+                cached = json.load(f)
+            logger.info(f"Reusing cached {stage} response from {cache_file}")
+            if output_file is not None:
+                with open(output_file, 'w') as f:
+                    f.write(cached["text"])
+            return SimpleNamespace(
+                content=[SimpleNamespace(text=cached["text"])],
+                usage=SimpleNamespace(input_tokens=cached["input_tokens"], output_tokens=cached["output_tokens"])
+            )
+        
+        response = self._send_message(output_file, params)
+        
+        # Written beside the entry and renamed, so a partial write is never read back
+        self.response_cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                "text": response.content[0].text,
+                "input_tokens": response.usage.input_tokens,
+                "output_tokens": response.usage.output_tokens
+            }, f)
+        os.replace(tmp_file, cache_file)
+        return response
+    
+    def _send_message(self, output_file: Optional[Path], params: Dict[str, Any]):
+        """
+        Send a stage request, retrying transient API errors with exponential backoff
+        
+        The client's own retries cover brief blips on the initial request; this
+        outer loop rides out longer overload windows and errors that interrupt a
+        stream part-way, so one transient failure does not throw away the
+        earlier stages' work. Waits double from api.retry_delay, with jitter so
+        concurrent batch questions do not retry in lockstep, capped at a minute.
+        """
+        retry_attempts = self.config["api"].get("retry_attempts", 3)
+        retry_delay = self.config["api"].get("retry_delay", 1.0)
+        
+        for attempt in range(retry_attempts + 1):
+            try:
+                return self._request_message(output_file, params)
+            except anthropic.APIError as e:
+                if attempt == retry_attempts or not _is_transient(e):
+                    raise
+                wait = min(60.0, retry_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"Transient API error ({e}); retry {attempt + 1}/{retry_attempts} in {wait:.1f}s")
+                time.sleep(wait)
+    
+    def _request_message(self, output_file: Optional[Path], params: Dict[str, Any]):
+        """messages.create, or a stream into output_file returning the final message"""
+        if output_file is None:
+            return self.api_client.messages.create(**params)
+        
+        try:
+            with open(output_file, 'w') as f:
+                with self.api_client.messages.stream(**params) as stream:
+                    for text in stream.text_stream:
+                        f.write(text)
+                    return stream.get_final_message()
+        except Exception:
+            # A cut-off response is not left behind as if it were the final output
+            output_file.unlink(missing_ok=True)
+            raise
+    
+    def _resumable(self, stage_file: Path, inputs_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Saved stage result when stage_file exists and was produced from the same inputs
+        
+        Stage artifacts embed the hash of the request that produced them, so a
+        result is only reused when the prompt, model and sampling settings all
+        match; anything else, including an unreadable file, reruns the stage.
+        """
+        try:
+            with open(stage_file, 'rb') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable checkpoint {stage_file}: {e}")
+            return None
+        
+        if saved.pop("inputs_hash", None) != inputs_hash:
+            return None
+        
+        logger.info(f"Resuming {saved.get('stage', stage_file.stem)} from checkpoint {stage_file}")
+        return saved
+    
     def _load_existing_config_knowledge(self) -> Dict[str, Any]:
         """Load existing configuration knowledge for schema enrichment"""
         config_file = self.project_root / "llm_columns_canonical.yaml"
         
-        if config_file.exists():
-            try:
-                with open(config_file, 'r') as f:
-                    return yaml.safe_load(f)
-            except Exception as e:
-                logger.warning(f"Could not load existing config: {e}")
+        # Parsed once and reused across stages until the file changes
+        try:
+            return load_yaml_config(str(config_file)) or {}
+        except Exception as e:
+            logger.warning(f"Could not load existing config: {e}")
         
         return {}
     
@@ -570,62 +914,177 @@ Please provide comprehensive business analysis with actionable recommendations u
         try:
             # Stage 1: Data Discovery and Schema Analysis
             data_files = self.discover_data_sources()
+            
             schema_result = self.stage_1_schema_discovery(data_files)
             
             # Stage 2: Question Analysis
             question_result = self.stage_2_question_analysis(question, schema_result)
             
             # Stage 3: Data Filtering
-            filter_result = self.stage_3_data_filtering(data_files, question_result)
+            filter_result = self.stage_3_data_filtering(data_files, question_result,
+                                                        schema_result=schema_result)
             
             # Stage 4: Output Generation
             output_result = self.stage_4_output_generation(question, schema_result, 
                                                          question_result, filter_result)
             
-            # Calculate pipeline metrics
-            pipeline_end = datetime.now()
-            total_duration = (pipeline_end - pipeline_start).total_seconds()
-            
-            # Aggregate token usage
-            total_tokens = 0
-            for result in [schema_result, question_result, filter_result, output_result]:
-                if "token_usage" in result:
-                    total_tokens += result["token_usage"].get("total", 0)
+            return self._complete_pipeline(question, pipeline_start, data_files, schema_result,
+                                           question_result, filter_result, output_result)
             
-            # Complete pipeline results
-            complete_results = {
+        except Exception as e:
+            logger.error(f"Pipeline failed: {e}")
+            return {
                 "session_id": self.session_id,
-                "timestamp": datetime.now().isoformat(),
-                "question": question,
-                "pipeline_duration_seconds": total_duration,
-                "total_token_usage": total_tokens,
-                "stages": {
-                    "data_discovery": data_files,
-                    "schema_discovery": schema_result,
-                    "question_analysis": question_result,
-                    "data_filtering": filter_result,
-                    "output_generation": output_result
-                },
-                "success": True
+                "error": str(e),
+                "success": False
             }
+    
+    def _complete_pipeline(self, question: str, pipeline_start: datetime, data_files: Dict[str, List[str]],
+                           schema_result: Dict[str, Any], question_result: Dict[str, Any],
+                           filter_result: Dict[str, Any], output_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Aggregate the stage results into the complete pipeline record and save it"""
+        # Calculate pipeline metrics
+        pipeline_end = datetime.now()
+        total_duration = (pipeline_end - pipeline_start).total_seconds()
+        
+        # Aggregate token usage
+        total_tokens = 0
+        for result in [schema_result, question_result, filter_result, output_result]:
+            if "token_usage" in result:
+                total_tokens += result["token_usage"].get("total", 0)
+        
+        # Complete pipeline results
+        complete_results = {
+            "session_id": self.session_id,
+            "timestamp": pipeline_end.isoformat(),  # the same instant the duration is measured to
+            "question": question,
+            "pipeline_duration_seconds": total_duration,
+            "total_token_usage": total_tokens,
+            "stages": {
+                "data_discovery": data_files,
+                "schema_discovery": schema_result,
+                "question_analysis": question_result,
+                "data_filtering": filter_result,
+                "output_generation": output_result
+            },
+            "success": True
+        }
+        
+        # Save complete results
+        complete_file = self.session_dir / "complete_pipeline_results.json"
+        write_json(complete_file, complete_results)
+        
+        logger.info(f"Pipeline complete! Duration: {total_duration:.1f}s, Tokens: {total_tokens}")
+        logger.info(f"Results saved to: {self.session_dir}")
+        
+        return complete_results
+    
+    def run_pipeline_batch(self, questions: List[str]) -> List[Dict[str, Any]]:
+        """
+        Execute the pipeline for several questions against the same data
+        
+        Data discovery, stage 1 and stage 3's data load do not depend on the
+        question, so they run once and are shared. Stages 2-4 then run
+        concurrently across questions on a thread pool bounded by
+        api.concurrency, each question writing its artifacts to its own
+        question_NNNN subdirectory of the session. Every finished pipeline is
+        appended to the session's results.jsonl as it completes.
+        
+        Args:
+            questions: User questions to analyze
             
-            # Save complete results
-            complete_file = self.session_dir / "complete_pipeline_results.json"
-            with open(complete_file, 'w') as f:
-                json.dump(complete_results, f, indent=2, default=str)
-            
-            logger.info(f"Pipeline complete! Duration: {total_duration:.1f}s, Tokens: {total_tokens}")
-            logger.info(f"Results saved to: {self.session_dir}")
-            
-            return complete_results
-            
+        Returns:
+            Complete pipeline results in the same order as questions
+        """
+        logger.info(f"Starting batch of {len(questions)} questions for session: {self.session_id}")
+        
+        data_files = self.discover_data_sources()
+        schema_result = self.stage_1_schema_discovery(data_files)
+        
+        # Stage 3's row selection is question-independent, so it is made once here;
+        # on failure each question's stage 3 retries the load and records the error
+        filter_data = None
+        curated_files = data_files.get("curated", [])
+        if curated_files and self.config["pipeline"]["stages"]["data_filtering"]["enabled"]:
+            try:
+                filter_data = self._load_filter_data(curated_files[0])
+            except Exception as e:
+                logger.error(f"Error loading data for filtering: {e}")
+        
+        # Questions a resumed batch already answered are taken from results.jsonl
+        completed = self._completed_batch_results()
+        if completed:
+            logger.info(f"Resuming batch: {len(completed)} questions already complete")
+        
+        with ThreadPoolExecutor(max_workers=self.config["api"].get("concurrency", 4)) as executor:
+            pending = {index: executor.submit(self._run_batch_question, index, question, data_files,
+                                              schema_result, filter_data)
+                       for index, question in enumerate(questions)
+                       if (index, question) not in completed}
+            results = [pending[index].result() if index in pending else completed[(index, question)]
+                       for index, question in enumerate(questions)]
+        
+        succeeded = sum(1 for result in results if result.get("success"))
+        logger.info(f"Batch complete: {succeeded}/{len(results)} pipelines succeeded")
+        return results
+    
+    def _run_batch_question(self, index: int, question: str, data_files: Dict[str, List[str]],
+                            schema_result: Dict[str, Any],
+                            filter_data: Optional[Tuple[pd.DataFrame, pd.DataFrame]]) -> Dict[str, Any]:
+        """Run stages 2-4 for one batch question and checkpoint the result"""
+        pipeline_start = datetime.now()
+        
+        # A shallow copy shares the config, API client and curated frame cache,
+        # but gets its own session directory and stage 3 hand-off
+        worker = copy.copy(self)
+        worker.session_dir = self.session_dir / f"question_{index:04d}"
+        worker._filtered_df = None
+        
+        try:
+            worker.session_dir.mkdir(exist_ok=True)
+            question_result = worker.stage_2_question_analysis(question, schema_result)
+            filter_result = worker.stage_3_data_filtering(data_files, question_result, filter_data,
+                                                          schema_result)
+            output_result = worker.stage_4_output_generation(question, schema_result,
+                                                             question_result, filter_result)
+            results = worker._complete_pipeline(question, pipeline_start, data_files, schema_result,
+                                                question_result, filter_result, output_result)
         except Exception as e:
-            logger.error(f"Pipeline failed: {e}")
-            return {
+            logger.error(f"Pipeline failed for question {index}: {e}")
+            results = {
                 "session_id": self.session_id,
+                "question": question,
                 "error": str(e),
                 "success": False
             }
+        
+        results["question_index"] = index
+        self._append_result(results)
+        return results
+    
+    def _completed_batch_results(self) -> Dict[Tuple[int, str], Dict[str, Any]]:
+        """Successful results already in the session's results.jsonl, keyed by (index, question)"""
+        completed = {}
+        try:
+            with open(self.session_dir / "results.jsonl", 'rb') as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut off by an interrupted run
+                    if result.get("success"):
+                        completed[(result["question_index"], result["question"])] = result
+        except FileNotFoundError:
+            pass
+        return completed
+    
+    def _append_result(self, results: Dict[str, Any]):
+        """Append one pipeline result to the session's results.jsonl"""
+        line = dump_json(results, indent=False) + b"\n"
+        
+        with self._results_lock:
+            with open(self.session_dir / "results.jsonl", 'ab') as f:
+                f.write(line)
 
 
 def main():
@@ -638,11 +1097,27 @@ def main():
                        help="Question to analyze")
     parser.add_argument("--config", "-c", 
                        help="Path to agent configuration file")
+    parser.add_argument("--cache-responses", action="store_true",
+                       help="Reuse stored LLM responses for stage calls with identical inputs")
+    parser.add_argument("--questions-file",
+                       help="Run a batch of questions, one per line, sharing data discovery and stage 1")
+    parser.add_argument("--resume", metavar="SESSION_ID",
+                       help="Continue an earlier session, skipping stages whose saved results are still valid")
     
     args = parser.parse_args()
     
     # Initialize and run pipeline
-    agent = MultiPromptAgent(args.config)
+    agent = MultiPromptAgent(args.config, cache_responses=args.cache_responses, resume_session=args.resume)
+    
+    if args.questions_file:
+        with open(args.questions_file, 'r') as f:
+            questions = [line.strip() for line in f if line.strip()]
+        batch_results = agent.run_pipeline_batch(questions)
+        succeeded = sum(1 for result in batch_results if result.get("success"))
+        print(f"\nBatch complete: {succeeded}/{len(batch_results)} pipelines succeeded")
+        print(f"Results saved to: {agent.session_dir / 'results.jsonl'}")
+        return
+    
     results = agent.run_complete_pipeline(args.question)
     
     # Print summary
@@ -655,7 +1130,8 @@ def main():
         print(f"Total Tokens: {results['total_token_usage']}")
         print(f"Question: {results['question']}")
         print("\nFinal output saved to:")
-        print(f"  {Path(results['session_id']).parent / f'session_{results['session_id']}' / 'final_output.txt'}")
+        session_dir_name = f"session_{results['session_id']}"
+        print(f"  {Path(results['session_id']).parent / session_dir_name / 'final_output.txt'}")
     else:
         print(f"Pipeline failed: {results.get('error')}")
 
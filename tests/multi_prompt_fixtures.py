@@ -0,0 +1,88 @@
+"""
+Shared fixture for the multi-prompt pipeline tests
+
+Runs the pipeline against a temporary project root with a small curated CSV.
+The API client is replaced with a recording fake, so no requests are sent.
+The pipeline module needs the anthropic SDK; tests using this fixture are
+skipped when it is not installed.
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import pandas as pd
+
+try:
+    import anthropic
+except ImportError:
+    anthropic = None
+
+# Add project root to path for imports
+repo_root = Path(__file__).parent.parent
+sys.path.insert(0, str(repo_root))
+
+
+class FakeMessages:
+    """Records every request and answers with a numbered canned response"""
+
+    def __init__(self):
+        self.requests = []
+        self.fail_streams = False
+
+    def create(self, **params):
+        self.requests.append(params)
+        text = f'Response {len(self.requests)} {{"relevant_columns": ["LOCATION_NAME", "priority_score"]}}'
+        return SimpleNamespace(content=[SimpleNamespace(text=text)],
+                               usage=SimpleNamespace(input_tokens=100, output_tokens=10))
+
+    @contextmanager
+    def stream(self, **params):
+        if self.fail_streams:
+            raise RuntimeError("stream interrupted")
+        response = self.create(**params)
+        yield SimpleNamespace(text_stream=iter([response.content[0].text]),
+                              get_final_message=lambda: response)
+
+
+@unittest.skipIf(anthropic is None, "anthropic is not installed")
+class MultiPromptTestCase(unittest.TestCase):
+    """Base class: a temporary project root and a fake API client per test"""
+
+    question = "Which of my locations need immediate attention?"
+    other_question = "Which cities have the lowest sales?"
+
+    def setUp(self):
+        self.messages = FakeMessages()
+        client = SimpleNamespace(messages=self.messages, api_key="test")
+        # The client factory is replaced before the pipeline module binds it on import
+        factory = mock.patch("config.claude_api_config.get_api_client", create=True, return_value=client)
+        factory.start()
+        self.addCleanup(factory.stop)
+        from scripts import multi_prompt_agent
+        self.module = multi_prompt_agent
+
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        curated_dir = self.root / "data" / "curated"
+        curated_dir.mkdir(parents=True)
+        pd.DataFrame({
+            "LOCATION_NAME": [f"Loc {i}" for i in range(40)],
+            "CITY": ["A", "B", "C", "D"] * 10,
+            "priority_score": [float(i * 37 % 500) for i in range(40)],
+            "CURRENT_WEEK__SALES": [float(i * 113 % 900) for i in range(40)],
+        }).to_csv(curated_dir / "locations.csv", index=False)
+
+        for patcher in (mock.patch.object(self.module, "project_root", self.root),
+                        mock.patch.object(self.module, "get_api_client", return_value=client)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def agent(self, session_id, **kwargs):
+        return self.module.MultiPromptAgent(str(repo_root / "config" / "agent_config.yaml"),
+                                            resume_session=session_id, **kwargs)
@@ -0,0 +1,40 @@
+"""
+Tests for config version bumping in the configuration learning manager
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scripts.config_learning_manager import _next_version
+
+
+class NextVersionTest(unittest.TestCase):
+    """_next_version bumps the minor part of a "major.minor" version"""
+
+    def test_bumps_minor(self):
+        self.assertEqual(_next_version("1.0"), "1.1")
+        self.assertEqual(_next_version("2.3"), "2.4")
+
+    def test_minor_is_numeric_not_decimal(self):
+        self.assertEqual(_next_version("1.9"), "1.10")
+        self.assertEqual(_next_version("1.10"), "1.11")
+
+    def test_major_only(self):
+        self.assertEqual(_next_version("3"), "3.1")
+        self.assertEqual(_next_version(3), "3.1")
+
+    def test_yaml_float_version(self):
+        # An unquoted "version: 1.0" loads from YAML as a float
+        self.assertEqual(_next_version(1.0), "1.1")
+
+    def test_rejects_non_numeric_version(self):
+        with self.assertRaises(ValueError):
+            _next_version("v1.0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests for the k-center representative subset selection in DataFilterAgent
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.data_filter import DataFilterAgent
+
+
+class SelectRepresentativeSubsetTest(unittest.TestCase):
+    """_select_representative_subset over hand-built scores and feature matrices"""
+
+    def setUp(self):
+        self.agent = DataFilterAgent()
+        rng = np.random.default_rng(0)
+        self.features = rng.random((200, 3), dtype=np.float32)
+        self.scores = self.features.sum(axis=1)
+        self.data = pd.DataFrame({"row": np.arange(200)})
+
+    def select(self, max_rows, scores=None, features=None, data=None):
+        return self.agent._select_representative_subset(
+            self.data if data is None else data,
+            self.scores if scores is None else scores,
+            self.features if features is None else features,
+            {"max_rows": max_rows}
+        )
+
+    def test_seeds_with_highest_scoring_row(self):
+        subset = self.select(10)
+        self.assertEqual(subset["row"].iloc[0], int(np.argmax(self.scores)))
+
+    def test_never_picks_a_row_twice(self):
+        for k in (1, 2, 25, 199):
+            subset = self.select(k)
+            self.assertEqual(len(subset), k)
+            self.assertTrue(subset["row"].is_unique, f"duplicate rows selected for k={k}")
+
+    def test_spreads_across_feature_space(self):
+        # Two tight clusters: the second pick must come from the cluster the seed is not in
+        features = np.vstack([np.zeros((50, 3)), np.ones((50, 3))]).astype(np.float32)
+        features[:50] += np.linspace(0, 0.01, 50, dtype=np.float32)[:, None]
+        scores = np.arange(100, dtype=np.float64)
+        data = pd.DataFrame({"row": np.arange(100)})
+        subset = self.select(2, scores=scores, features=features, data=data)
+        self.assertEqual(subset["row"].iloc[0], 99)
+        self.assertLess(subset["row"].iloc[1], 50)
+
+    def test_returns_all_rows_when_k_covers_them(self):
+        for k in (200, 500):
+            subset = self.select(k)
+            self.assertIs(subset, self.data)
+
+    def test_zero_rows_requested(self):
+        subset = self.select(0)
+        self.assertEqual(len(subset), 0)
+        self.assertListEqual(list(subset.columns), ["row"])
+
+    def test_constant_features_and_tied_scores(self):
+        features = np.full((50, 3), 0.5, dtype=np.float32)
+        scores = np.ones(50)
+        data = pd.DataFrame({"row": np.arange(50)})
+        subset = self.select(10, scores=scores, features=features, data=data)
+        self.assertEqual(len(subset), 10)
+        self.assertTrue(subset["row"].is_unique)
+        # Ties go to the first row, as with np.argmax
+        self.assertEqual(subset["row"].iloc[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
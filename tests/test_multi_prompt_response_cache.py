@@ -0,0 +1,31 @@
+"""
+Tests for the multi-prompt pipeline's opt-in LLM response cache
+"""
+
+import unittest
+
+from tests.multi_prompt_fixtures import MultiPromptTestCase
+
+
+class MultiPromptResponseCacheTest(MultiPromptTestCase):
+    """Cached responses are reused across sessions for identical requests"""
+
+    def test_response_cache_spans_sessions(self):
+        self.agent("cache_a", cache_responses=True).run_complete_pipeline(self.question)
+        calls = len(self.messages.requests)
+
+        # Per-run values (timestamps, token usage, session paths) are not part of the cache key
+        cached = self.agent("cache_b", cache_responses=True).run_complete_pipeline(self.question)
+        self.assertEqual(len(self.messages.requests), calls)
+        self.assertTrue(cached["success"])
+
+    def test_new_question_misses_question_dependent_stages(self):
+        self.agent("cache_a", cache_responses=True).run_complete_pipeline(self.question)
+        calls = len(self.messages.requests)
+
+        self.agent("cache_b", cache_responses=True).run_complete_pipeline(self.other_question)
+        self.assertEqual(len(self.messages.requests), calls + 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
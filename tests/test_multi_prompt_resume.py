@@ -0,0 +1,51 @@
+"""
+Tests for resuming a multi-prompt pipeline session from its stage checkpoints
+"""
+
+import unittest
+
+from tests.multi_prompt_fixtures import MultiPromptTestCase
+
+
+class MultiPromptResumeTest(MultiPromptTestCase):
+    """Stages whose saved results match their inputs are not rerun"""
+
+    def test_resume_reuses_every_completed_stage(self):
+        first = self.agent("first").run_complete_pipeline(self.question)
+        calls = len(self.messages.requests)
+        self.assertTrue(first["success"])
+
+        resumed = self.agent("first").run_complete_pipeline(self.question)
+        self.assertEqual(len(self.messages.requests), calls)
+        for stage in ("schema_discovery", "question_analysis", "data_filtering", "output_generation"):
+            self.assertEqual(resumed["stages"][stage], first["stages"][stage])
+
+    def test_resume_reruns_only_the_failed_stage(self):
+        self.messages.fail_streams = True
+        failed = self.agent("failed").run_complete_pipeline(self.question)
+        self.assertIn("error", failed["stages"]["output_generation"])
+
+        self.messages.fail_streams = False
+        calls = len(self.messages.requests)
+        resumed = self.agent("failed").run_complete_pipeline(self.question)
+        self.assertEqual(len(self.messages.requests), calls + 1)
+        self.assertTrue(resumed["success"])
+
+    def test_resume_with_new_question_reruns_dependent_stages(self):
+        self.agent("changed").run_complete_pipeline(self.question)
+        calls = len(self.messages.requests)
+
+        self.agent("changed").run_complete_pipeline(self.other_question)
+        # Schema discovery does not depend on the question; the three later stages do
+        self.assertEqual(len(self.messages.requests), calls + 3)
+
+    def test_fresh_session_calls_every_stage(self):
+        self.agent("fresh_a").run_complete_pipeline(self.question)
+        calls = len(self.messages.requests)
+
+        self.agent("fresh_b").run_complete_pipeline(self.question)
+        self.assertEqual(len(self.messages.requests), calls * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()